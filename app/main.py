@@ -4,85 +4,270 @@
 
 import streamlit as st
 import os
-import io
+import html
 import sys
+import shutil
+import zlib
+import hashlib
 from pathlib import Path
-import plotly.express as px
-import pandas as pd
 import zipfile
 import requests
-import tempfile
-import requests
-import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+_ROOT = Path(__file__).resolve().parent.parent
+_DATA_PATH = _ROOT / "data"
+_DB_PATH = _DATA_PATH / "chroma_db"
+_ZIP_PATH = _DATA_PATH / "chroma_db.zip"
+_DATASET = _ROOT / "dataset"
 
 # Add parent directory to path to import RAG modules
-sys.path.append(str(Path(__file__).parent.parent))
+sys.path.append(str(_ROOT))
 
-from rag.prompting import RAGSystem
+from rag.prompting import RAGSystem, SemanticCache, AnswerBatcher, AnswerGenerator, is_no_answer_response
+from rag.indexing import VectorStore
+from rag.retrieval import AdvancedRetriever
 
 # Vector store download URL - you'll need to replace this with your actual URL
 
 VECTOR_STORE_ID = "1_g8GO7pdODTyuxGyAYg6pB2FY3Z8iLoG"
 VECTOR_STORE_URL = f"https://drive.google.com/uc?export=download&confirm=1&id={VECTOR_STORE_ID}"
+# Expected CRC32 of the archive (hex); downloads are verified when it is set
+VECTOR_STORE_CRC32 = os.getenv("VECTOR_STORE_CRC32")
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MB per write
+PARALLEL_EXTRACT_MIN_SIZE = 10 * 1024 * 1024  # Only parallelize archives over 10 MB
+
+
+class _ChecksumWriter:
+    """File-like writer that keeps a running CRC32 of everything written."""
+
+    def __init__(self, file, crc=0):
+        self.file = file
+        self.crc = crc
+
+    def write(self, data):
+        self.crc = zlib.crc32(data, self.crc)
+        return self.file.write(data)
+
+
+def _file_crc32(path):
+    """Compute the CRC32 of a file on disk."""
+    crc = 0
+    with open(path, "rb") as file:
+        while chunk := file.read(DOWNLOAD_CHUNK_SIZE):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def _extract_members(zip_path, members, target_path):
+    """Extract a subset of archive members using a private ZipFile handle."""
+    # ZipFile is not safe for concurrent reads, so each worker opens its own
+    with zipfile.ZipFile(zip_path) as zip_ref:
+        for member in members:
+            zip_ref.extract(member, target_path)
 
-def download_vector_store_in_memory():
-    """Download vector store from Google Drive and extract in memory."""
-    db_path = Path(__file__).parent.parent / "data" / "chroma_db"
-    if db_path.exists():
+
+def extract_vector_store(zip_path, target_path):
+    """Extract the vector store archive, fanning out across threads for large archives."""
+    if os.path.getsize(zip_path) < PARALLEL_EXTRACT_MIN_SIZE:
+        with zipfile.ZipFile(zip_path) as zip_ref:
+            zip_ref.extractall(target_path)
+        return
+
+    with zipfile.ZipFile(zip_path) as zip_ref:
+        infos = zip_ref.infolist()
+
+    # Create directories up front so workers don't race on makedirs
+    for info in infos:
+        if info.is_dir():
+            (Path(target_path) / info.filename).mkdir(parents=True, exist_ok=True)
+        else:
+            (Path(target_path) / info.filename).parent.mkdir(parents=True, exist_ok=True)
+
+    # zlib releases the GIL while decompressing, so threads extract in parallel
+    files = [info for info in infos if not info.is_dir()]
+    workers = min(os.cpu_count() or 1, len(files)) or 1
+    batches = [files[i::workers] for i in range(workers)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_extract_members, zip_path, batch, target_path) for batch in batches]
+        for future in futures:
+            future.result()
+
+
+def _remote_content_length(url):
+    """Get the size of the remote file from a HEAD request, or None if it is unknown."""
+    try:
+        head = requests.head(url, allow_redirects=True, timeout=30)
+        head.raise_for_status()
+        return int(head.headers["Content-Length"])
+    except (requests.RequestException, KeyError, ValueError):
+        return None
+
+
+def _fetch_vector_store_zip(resume_from):
+    """Download the archive to data/chroma_db.zip, resuming from resume_from bytes, and return its CRC32."""
+    headers = {"Range": f"bytes={resume_from}-"} if resume_from else {}
+
+    crc = 0
+    with requests.get(VECTOR_STORE_URL, stream=True, headers=headers) as response:
+        mode = None  # 416 means the partial file is already complete
+        if response.status_code != 416:
+            response.raise_for_status()
+            # Append only if the server honoured the range request, otherwise start over
+            mode = "ab" if response.status_code == 206 else "wb"
+
+        # Seed the running checksum with the bytes kept from an earlier attempt
+        if VECTOR_STORE_CRC32 and mode != "wb":
+            crc = _file_crc32(_ZIP_PATH)
+
+        if mode:
+            # Copy in C with a large buffer, checksumming each block as it is written
+            response.raw.decode_content = True
+            with open(_ZIP_PATH, mode) as zip_file:
+                writer = _ChecksumWriter(zip_file, crc)
+                shutil.copyfileobj(response.raw, writer, length=DOWNLOAD_CHUNK_SIZE)
+            crc = writer.crc
+
+    return crc
+
+
+def download_vector_store():
+    """Download vector store from Google Drive to disk, resuming partial downloads, and extract it."""
+    if _DB_PATH.exists():
         return True  # Already exists
 
     try:
         st.info("🔄 Downloading vector store...")
-        db_path.mkdir(parents=True, exist_ok=True)
+        _DATA_PATH.mkdir(parents=True, exist_ok=True)
+
+        # Compare with the remote size to skip, resume or restart the download
+        remote_size = _remote_content_length(VECTOR_STORE_URL)
+        local_size = _ZIP_PATH.stat().st_size if _ZIP_PATH.exists() else 0
+        if remote_size is not None and local_size > remote_size:
+            _ZIP_PATH.unlink()  # Can't be a prefix of the remote archive, start over
+            local_size = 0
+
+        if local_size and local_size == remote_size:
+            print("Vector store archive already fully downloaded, skipping download")
+            crc = _file_crc32(_ZIP_PATH) if VECTOR_STORE_CRC32 else 0
+        else:
+            crc = _fetch_vector_store_zip(local_size)
 
-        # Download zip file into memory
-        response = requests.get(VECTOR_STORE_URL, stream=True)
-        response.raise_for_status()
-        zip_bytes = io.BytesIO(response.content)
+        # Catch corruption before spending time on extraction
+        if VECTOR_STORE_CRC32 and crc != int(VECTOR_STORE_CRC32, 16):
+            _ZIP_PATH.unlink()
+            raise ValueError("Downloaded vector store failed its CRC32 check, it will be downloaded again")
 
         # Validate it's actually a ZIP file
-        if not zipfile.is_zipfile(zip_bytes):
+        if not zipfile.is_zipfile(_ZIP_PATH):
+            _ZIP_PATH.unlink()
             raise ValueError("Downloaded file is not a valid ZIP (Google Drive HTML page received)")
 
-        st.info("📦 Extracting vector store in memory...")
-        zip_bytes.seek(0)  # Reset position after validation
-        with zipfile.ZipFile(zip_bytes) as zip_ref:
-            zip_ref.extractall(db_path.parent)  # Creates data/chroma_db/ directly
-
+        st.info("📦 Extracting vector store...")
+        extract_vector_store(_ZIP_PATH, _DATA_PATH)  # Creates data/chroma_db/ directly
+        _ZIP_PATH.unlink()
 
         st.success("✅ Vector store ready!")
         return True
 
     except Exception as e:
+        # A partial zip is kept so the next attempt can resume it
         st.error(f"Failed to download vector store: {str(e)}")
         return False
 
+
+@st.cache_resource
+def _vector_store_status():
+    """Process-wide record of whether the vector store is ready on disk."""
+    return {"ready": False}
+
+
 def ensure_vector_store_exists():
+    """Ensure vector store exists, remembering success for the lifetime of the server."""
+    status = _vector_store_status()
+    if not status["ready"]:
+        # Only success is remembered, so a failed setup is retried by the next session
+        status["ready"] = setup_vector_store()
+    return status["ready"]
+
+
+def setup_vector_store():
     """Ensure vector store exists by downloading if needed."""
-    db_path = Path(__file__).parent.parent / "data" / "chroma_db"
-    zip_path = Path(__file__).parent.parent / "data" / "chroma_db.zip"
-    
     # If vector store doesn't exist, try to download it
-    if not db_path.exists():
-        if zip_path.exists():
-            # Local zip exists, extract it
+    if not _DB_PATH.exists():
+        if zipfile.is_zipfile(_ZIP_PATH):
+            # Complete local zip exists, extract it
             st.info("🔄 Setting up vector store for first use...")
             try:
-                with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                    zip_ref.extractall(Path(__file__).parent.parent / "data")
+                extract_vector_store(_ZIP_PATH, _DATA_PATH)
                 st.success("✅ Vector store ready!")
                 return True
             except Exception as e:
                 st.error(f"Failed to extract vector store: {str(e)}")
                 return False
         else:
-            # No local zip, download from external source
-            return download_vector_store_in_memory()
+            # No local zip, or a partial download to resume, fetch from external source
+            return download_vector_store()
+
+    return _DB_PATH.exists()
+
+
+@st.cache_resource
+def get_retriever():
+    """Load the vector store and retriever once and share them across all sessions."""
+    return AdvancedRetriever(VectorStore())
+
+
+@st.cache_resource
+def get_semantic_cache():
+    """Share cached answers to standalone questions across all sessions."""
+    return SemanticCache()
 
-    return db_path.exists()
+
+@st.cache_resource
+def get_answer_batcher():
+    """Share one answer batcher so concurrent sessions' questions can be batched."""
+    return AnswerBatcher(AnswerGenerator())
+
+
+def get_rag_system():
+    """Create a per-session RAG system backed by the shared vector store."""
+    retriever = get_retriever()
+    return RAGSystem(
+        vector_store=retriever.vector_store,
+        retriever=retriever,
+        semantic_cache=get_semantic_cache(),
+        answer_batcher=get_answer_batcher()
+    )
+
+
+@st.cache_data(ttl=30)
+def get_collection_stats():
+    """Get vector store statistics, cached across reruns."""
+    return get_retriever().vector_store.get_collection_stats()
+
+
+@st.cache_data(ttl=30)
+def get_document_sources():
+    """Get document sources from the shared retriever, cached across reruns."""
+    return get_retriever().get_document_sources()
+
+
+def get_system_stats():
+    """Get system statistics, reusing the cached vector store stats and sources."""
+    return st.session_state.rag_system.get_system_stats(
+        vector_stats=get_collection_stats(),
+        source_count=len(get_document_sources())
+    )
+
+
+def clear_cached_stats():
+    """Invalidate cached statistics after the vector store changes."""
+    get_collection_stats.clear()
+    get_document_sources.clear()
 
 # Page configuration
-icon_path = str(Path(__file__).parent.parent / "dataset" / "GetClever.png")
+icon_path = str(_DATASET / "GetClever.png")
 st.set_page_config(
     page_title="GetClever",
     page_icon=icon_path,
@@ -90,211 +275,15 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Custom CSS for professional styling
+
+@st.cache_data
+def load_css():
+    """Read the app stylesheet once; reruns reuse the cached string."""
+    return (Path(__file__).parent / "static" / "style.css").read_text(encoding="utf-8")
+
 
 # Custom CSS for professional styling
-st.markdown("""
-<style>
-@import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600&display=swap');
-
-/* =====================
-   GLOBAL BASE
-===================== */
-html, body, .stApp {
-    background-color: #F4F3F0;
-    font-family: 'Inter', sans-serif;
-    color: #1E1E1E; ,
-    font-size: 11px;   /* GLOBAL SMALL FONT */
-}
-
-/* Main container */
-.stMainBlockContainer {
-    background-color: #F4F3F0;
-    padding-top: 1.5rem;
-}
-
-/* =====================
-   HEADERS (SMALLER)
-===================== */
-h1 { font-size: 22px !important; font-weight: 600; }
-h2 { font-size: 18px !important; font-weight: 600; }
-h3 { font-size: 16px !important; font-weight: 500; }
-h4 { font-size: 14.5px !important; font-weight: 500; }
-
-/* Markdown text */
-.stMarkdown, p, li, span {
-    font-size: 12px !important;
-    line-height: 1.5;
-}
-
-/* =====================
-   SIDEBAR
-===================== */
-.stSidebar {
-    background-color: #F4F3F0 !important;
-}
-
-.stSidebar * {
-    font-size: 10.5px !important;
-    color: #143d33 !important;
-}
-
-.stSidebar h1, 
-.stSidebar h2, 
-.stSidebar h3 {
-    font-size: 12px !important;
-    color: #1E1E1E !important;
-}
-
-/* =====================
-   BUTTONS - PROPER CONTRAST & BIGGER TEXT
-===================== */
-.stButton > button {
-    font-size: 13px !important;  /* Bigger button text */
-    border-radius: 8px !important;
-    padding: 0.6rem 1.2rem !important;  /* More padding */
-    font-weight: 600 !important;
-    border: 2px solid #143d33 !important;
-    transition: all 0.2s ease !important;
-}
-
-/* PRIMARY BUTTONS: Green background = White text */
-.stButton > button[kind="primary"] {
-    background-color: #143d33 !important;  /* Green background */
-    color: #FFFFFF !important;              /* WHITE text */
-    border: 2px solid #143d33 !important;
-}
-
-.stButton > button[kind="primary"]:hover {
-    background-color: #0F2A1F !important;  /* Darker green background */
-    color: #FFFFFF !important;              /* WHITE text */
-    border: 2px solid #0F2A1F !important;
-    transform: translateY(-1px) !important;
-    box-shadow: 0 4px 8px rgba(15, 42, 31, 0.3) !important;
-}
-
-/* SECONDARY BUTTONS: White background = Green text */
-.stButton > button[kind="secondary"] {
-    background-color: #FFFFFF !important;  /* WHITE background */
-    color: #143d33 !important;              /* Green text */
-    border: 2px solid #143d33 !important;
-}
-
-.stButton > button[kind="secondary"]:hover {
-    background-color: #E8E6E1 !important;  /* Light background */
-    color: #0F2A1F !important;              /* Dark green text */
-    transform: translateY(-1px) !important;
-    box-shadow: 0 4px 8px rgba(15, 42, 31, 0.3) !important;
-}
-
-/* =====================
-   CHAT
-===================== */
-.stChatMessage {
-    background-color: #FFFFFF !important;
-    border: 1px solid rgba(20,61,51,0.35) !important;
-    border-radius: 10px !important;
-    padding: 0.75rem !important;
-}
-
-.stChatMessage * {
-    font-size: 11px !important;
-}
-
-.stChatInput textarea {
-    font-size: 11px !important;
-    border-radius: 10px !important;
-    border: 1px solid #143d33 !important;
-}
-
-/* =====================
-   METRICS
-===================== */
-.stMetric {
-    background-color: #FFFFFF !important;
-    padding: 0.75rem !important;
-    border-radius: 10px !important;
-    border: 1px solid rgba(20,61,51,0.35) !important;
-}
-
-.stMetric label {
-    font-size: 10px !important;
-    color: #143d33 !important;
-}
-
-.stMetric [data-testid="stMetricValue"] {
-    font-size: 14px !important;
-    font-weight: 600 !important;
-}
-
-/* ====================
-   CARDS / CONTAINERS
-===================== */
-.main-card,
-.chat-container {
-    background-color: #FFFFFF !important;
-    border-radius: 12px !important;
-    padding: 1.25rem !important;
-    border: 1px solid rgba(20,61,51,0.35) !important;
-}
-
-/* =====================
-   APP TITLE
-===================== */
-.app-title {
-    font-size: 22px !important;
-    font-weight: 600 !important;
-    margin-bottom: 0.25rem !important;
-}
-
-.app-subtitle {
-    font-size: 12px !important;
-    color: #143d33 !important;
-}
-
-/* =====================
-   CLEAN STREAMLIT
-===================== */
-#MainMenu { visibility: hidden; }
-footer { visibility: hidden; }
-.stDeployButton { visibility: hidden; }
-
-
-
-
-<style>
-/* Follow-up buttons */
-div.stButton > button {
-    background-color: #f8f9fa;
-    color: #333;
-    border-radius: 10px;
-    border: 1px solid #ddd;
-    padding: 8px 14px;
-    margin: 4px 0;
-    transition: all 0.2s ease-in-out;
-    box-shadow: 0px 2px 6px rgba(0,0,0,0.08);
-}
-
-/* Hover effect - Light background with dark text */
-div.stButton > button:hover {
-    box-shadow: 0px 6px 16px rgba(15, 42, 31, 0.3) !important;
-    transform: translateY(-2px) !important;
-    background-color: #E8E6E1 !important;  /* Lighter version of #F4F3F0 */
-    color: #0F2A1F !important;              /* Dark green text */
-    border: 2px solid #143d33 !important;
-}
-
-/* Click (active) effect - Even lighter background */
-div.stButton > button:active {
-    box-shadow: inset 0px 3px 8px rgba(15, 42, 31, 0.4) !important;
-    transform: translateY(1px) !important;
-    background-color: #DDD9D2 !important;  /* Even lighter background */
-    color: #0F2A1F !important;              /* Dark green text */
-}
-
-
-</style>
-""", unsafe_allow_html=True)
+st.markdown(f"<style>{load_css()}</style>", unsafe_allow_html=True)
 
 
 # Initialize session state
@@ -302,13 +291,18 @@ if "rag_system" not in st.session_state:
     # Ensure vector store is available (download if needed)
     if ensure_vector_store_exists():
         try:
-            st.session_state.rag_system = RAGSystem()
+            st.session_state.rag_system = get_rag_system()
         except Exception as e:
             st.error(f"Failed to initialize RAG system: {str(e)}")
             st.stop()
     else:
         st.error("Vector store not available. Please check deployment.")
         st.stop()
+elif st.session_state.rag_system.retriever is not get_retriever():
+    # Another session reloaded the shared vector store, so stop using the old client
+    history = st.session_state.rag_system.conversation_history
+    st.session_state.rag_system = get_rag_system()
+    st.session_state.rag_system.conversation_history = history
 
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
@@ -316,8 +310,7 @@ if "chat_history" not in st.session_state:
 if "documents_ingested" not in st.session_state:
     # Check if documents are already ingested by checking vector store
     try:
-        stats = st.session_state.rag_system.get_system_stats()
-        st.session_state.documents_ingested = stats["vector_store_stats"]["count"] > 0
+        st.session_state.documents_ingested = get_collection_stats()["count"] > 0
     except Exception as e:
         st.warning(f"Could not check vector store status: {str(e)}")
         st.session_state.documents_ingested = False
@@ -334,9 +327,9 @@ def process_followup_question(question):
     # Generate response using RAG system
     response = st.session_state.rag_system.query(
         question,
-        use_hybrid_search=getattr(st.session_state, 'use_hybrid', True),
-        use_reranking=getattr(st.session_state, 'use_reranking', True),
-        k=getattr(st.session_state, 'k_docs', 5),
+        use_hybrid_search=st.session_state.get('use_hybrid', True),
+        use_reranking=st.session_state.get('use_reranking', True),
+        k=st.session_state.get('k_docs', 5),
         include_conversation_context=True
     )
     
@@ -351,41 +344,77 @@ def process_followup_question(question):
             "search_method": response.get("search_method", "semantic"),
             "retrieved_docs": response.get("retrieved_docs", 0)
         },
-        "followup_questions": response.get("followup_questions", [])
+        "followup_questions": response.get("followup_questions", []),
+        "followup_keys": followup_keys(
+            len(st.session_state.chat_history), response.get("followup_questions", [])
+        ),
+        "has_substantive_answer": has_substantive_answer(response)
     })
     
     # Rerun to display the new messages
     st.rerun()
 
 
-def is_no_answer_response(answer_text):
-    """Check if the response is a 'no answer' type response."""
-    response_lower = answer_text.lower().strip()
-    
-    # User-friendly no-answer patterns (no mention of documents)
-    no_answer_patterns = [
-        "i don't have enough information",
-        "i don't currently have the necessary details",
-        "there isn't enough reliable information",
-        "i'm unable to find a clear answer",
-        "i cannot find information",
-        "no information is available",
-        "insufficient information",
-        "not enough information",
-        "unable to provide",
-        "not available at this time"
+def followup_keys(index, questions):
+    """Build stable widget keys for a message's follow-up buttons once, at append time."""
+    # hashlib rather than hash(), which is salted per process
+    return [
+        f"fu_{index}_{j}_{hashlib.blake2b(question.encode(), digest_size=4).hexdigest()}"
+        for j, question in enumerate(questions)
     ]
-    
-    # Check if response contains any no-answer patterns
-    for pattern in no_answer_patterns:
-        if pattern in response_lower:
-            return True
-    
-    # Additional check: very short responses that are likely "no answer"
-    if len(response_lower) < 100 and any(word in response_lower for word in ["don't", "can't", "cannot", "unable", "insufficient"]):
-        return True
-        
-    return False
+
+
+def has_substantive_answer(response):
+    """Decide once, when a response is received, whether it contains a real answer."""
+    return response.get("has_substantive_answer", True) and not is_no_answer_response(response["answer"])
+
+
+def render_answer_metadata(metadata):
+    """Show evidence strength, source count and search method as one markdown element."""
+    confidence = metadata.get("confidence", "medium")
+    method = metadata.get("search_method", "semantic")
+    st.markdown(f"""
+        <div style="display: flex; gap: 1rem;">
+            <div style="flex: 1;"><strong>Evidence Strength:</strong> {html.escape(confidence.title())}</div>
+            <div style="flex: 1;"><strong>Sources:</strong> {metadata.get('sources_used', 0)}</div>
+            <div style="flex: 1;"><strong>Search:</strong> {html.escape(method.title())}</div>
+        </div>
+        """, unsafe_allow_html=True)
+
+
+@st.fragment
+def _render_message(message):
+    """Render one chat history message; widget interactions rerun only this fragment."""
+    if message["role"] == "user":
+        with st.chat_message("user"):
+            st.write(message["content"])
+    else:
+        with st.chat_message("assistant"):
+            st.write(message["content"])
+            
+            # Check if this is a "no answer" response
+            is_no_answer = not message.get("has_substantive_answer", True)
+            
+            # Only show citations and metadata if there's an actual answer
+            if not is_no_answer:
+                # Show citations if available
+                if message.get("citations"):
+                    with st.expander("📚 Citations"):
+                        for citation in message["citations"]:
+                            st.write(f"• {citation}")
+            
+                # Show confidence and stats
+                if message.get("metadata"):
+                    metadata = message["metadata"]
+                    render_answer_metadata(metadata)
+            
+            # Always show follow-up questions (even for no-answer responses)
+            if message.get("followup_questions"):
+                st.markdown("** Follow-up questions:**")
+                for question, key in zip(message["followup_questions"], message["followup_keys"]):
+                    if st.button(question, key=key):
+                        # Process the follow-up question immediately
+                        process_followup_question(question)
 
 
 def main():
@@ -434,20 +463,17 @@ def main():
 
     # Main chat interface (full width)
     if not st.session_state.documents_ingested:
-        vector_store_path = Path(__file__).parent.parent / "data" / "chroma_db"
-        dataset_path = Path(__file__).parent.parent / "dataset"
-        
         st.markdown("""
         <div class="main-card">
             <h3>🚀 Getting Started with GetClever</h3>
         """, unsafe_allow_html=True)
         
-        if vector_store_path.exists():
+        if _DB_PATH.exists():
             st.markdown("""
             <p><strong>✅ Pre-built vector store detected!</strong></p>
             <p>Click <strong>"Load Vector Store"</strong> in the sidebar to start chatting immediately.</p>
             """, unsafe_allow_html=True)
-        elif dataset_path.exists() and any(dataset_path.iterdir()):
+        elif _DATASET.exists() and any(_DATASET.iterdir()):
             st.markdown("""
             <p><strong>📁 Dataset folder found!</strong></p>
             <p>Click <strong>"Ingest Documents"</strong> in the sidebar to process your documents.</p>
@@ -471,7 +497,7 @@ def main():
         return
     else:
         # Show ready status
-        stats = st.session_state.rag_system.get_system_stats()
+        collection_stats = get_collection_stats()
         st.markdown(f"""
             <div style="
                background-color: #143d33;       /* Dark green background */
@@ -482,7 +508,7 @@ def main():
                border-radius: 10px;              /* Rounded corners */
                box-shadow: 3px 3px 8px rgba(0,0,0,0.4); /* Subtle shadow */
             ">
-                Ready! {stats['vector_store_stats']['count']} document chunks loaded
+                Ready! {collection_stats['count']} document chunks loaded
             </div>
             """, unsafe_allow_html=True)
 
@@ -490,45 +516,8 @@ def main():
     st.markdown("### Chat with your Documents")
     
     # Display chat history
-    for i, message in enumerate(st.session_state.chat_history):
-        if message["role"] == "user":
-            with st.chat_message("user"):
-                st.write(message["content"])
-        else:
-            with st.chat_message("assistant"):
-                st.write(message["content"])
-                
-                # Check if this is a "no answer" response
-                is_no_answer = message.get("has_substantive_answer", True) == False or is_no_answer_response(message["content"])
-                
-                # Only show citations and metadata if there's an actual answer
-                if not is_no_answer:
-                    # Show citations if available
-                    if message.get("citations"):
-                        with st.expander("📚 Citations"):
-                            for citation in message["citations"]:
-                                st.write(f"• {citation}")
-                    
-                    # Show confidence and stats
-                    if message.get("metadata"):
-                        metadata = message["metadata"]
-                        col1, col2, col3 = st.columns(3)
-                        with col1:
-                            confidence = metadata.get("confidence", "medium")
-                            st.markdown(f"**Evidence Strength:** {confidence.title()}")
-                        with col2:
-                            st.write(f"**Sources:** {metadata.get('sources_used', 0)}")
-                        with col3:
-                            method = metadata.get('search_method', 'semantic')
-                            st.write(f"**Search:** {method.title()}")
-                
-                # Always show follow-up questions (even for no-answer responses)
-                if message.get("followup_questions"):
-                    st.markdown("** Follow-up questions:**")
-                    for j, question in enumerate(message["followup_questions"]):
-                        if st.button(f"{question}", key=f"followup_{i}_{j}"):
-                            # Process the follow-up question immediately
-                            process_followup_question(question)
+    for message in st.session_state.chat_history:
+        _render_message(message)
 
     # Chat input
     if prompt := st.chat_input("Ask a question about your documents..."):
@@ -542,22 +531,19 @@ def main():
         with st.chat_message("user"):
             st.write(prompt)
         
-        # Generate response
+        # Generate response, streaming the answer as it is produced
         with st.chat_message("assistant"):
-            with st.spinner("🤔 Thinking..."):
-                response = st.session_state.rag_system.query(
-                    prompt,
-                    use_hybrid_search=True,
-                    use_reranking=True,
-                    k=5,
-                    include_conversation_context=True
-                )
-            
-            # Display answer
-            st.write(response["answer"])
+            st.write_stream(st.session_state.rag_system.stream_query(
+                prompt,
+                use_hybrid_search=True,
+                use_reranking=True,
+                k=5,
+                include_conversation_context=True
+            ))
+            response = st.session_state.rag_system.last_response
             
             # Check if this is a "no answer" response
-            is_no_answer = response.get("has_substantive_answer", True) == False or is_no_answer_response(response["answer"])
+            is_no_answer = not has_substantive_answer(response)
             
             # Only show citations and metadata if there's an actual answer
             if not is_no_answer:
@@ -568,21 +554,18 @@ def main():
                             st.write(f"• {citation}")
                 
                 # Show metadata
-                col1, col2, col3 = st.columns(3)
-                with col1:
-                    confidence = response.get("confidence", "medium")
-                    st.markdown(f"**Evidence Strength:** {confidence.title()}")
-                with col2:
-                    st.write(f"**Sources:** {response.get('sources_used', 0)}")
-                with col3:
-                    method = response.get('search_method', 'semantic')
-                    st.write(f"**Search:** {method.title()}")
+                render_answer_metadata(response)
+            
+            # Same keys as the stored message, so a click survives the rerun into history
+            response_followup_keys = followup_keys(
+                len(st.session_state.chat_history), response.get("followup_questions", [])
+            )
             
             # Always show follow-up questions (even for no-answer responses)
             if response.get("followup_questions"):
                 st.markdown("** Follow-up questions:**")
-                for j, question in enumerate(response["followup_questions"]):
-                    if st.button(f"{question}", key=f"new_followup_{j}"):
+                for question, key in zip(response["followup_questions"], response_followup_keys):
+                    if st.button(question, key=key):
                         # Process the follow-up question immediately
                         process_followup_question(question)
             
@@ -597,7 +580,9 @@ def main():
                     "search_method": response.get("search_method", "semantic"),
                     "retrieved_docs": response.get("retrieved_docs", 0)
                 },
-                "followup_questions": response.get("followup_questions", [])
+                "followup_questions": response.get("followup_questions", []),
+                "followup_keys": response_followup_keys,
+                "has_substantive_answer": not is_no_answer
             })
     
     st.markdown('</div>', unsafe_allow_html=True)
@@ -605,9 +590,13 @@ def main():
 
 def show_analytics_page():
     """Show analytics and observability dashboard."""
+    # Imported here so chat-only sessions don't pay for loading plotly and pandas
+    import plotly.express as px
+    import pandas as pd
+    
     st.markdown("### Analytics Dashboard")
     
-    stats = st.session_state.rag_system.get_system_stats()
+    stats = get_system_stats()
     
     # Overview metrics
     st.markdown("#### Overview")
@@ -624,7 +613,7 @@ def show_analytics_page():
     
     # Document sources
     st.markdown("#### Document Sources")
-    sources = st.session_state.rag_system.get_document_sources()
+    sources = get_document_sources()
     
     if sources:
         df_sources = pd.DataFrame(sources)
@@ -705,23 +694,21 @@ if __name__ == "__main__":
         # Document ingestion section
         st.markdown("#### Document Management")
         
-        # Check if vector store exists
-        vector_store_path = Path(__file__).parent.parent / "data" / "chroma_db"
-        
         if st.session_state.documents_ingested:
             st.success("✅ Documents already loaded!")
-            stats = st.session_state.rag_system.get_system_stats()
-            st.info(f"Ready with {stats['vector_store_stats']['count']} document chunks")
-        elif vector_store_path.exists():
+            st.info(f"Ready with {get_collection_stats()['count']} document chunks")
+        elif _DB_PATH.exists():
             st.info("📦 Pre-built vector store detected")
             if st.button("🔄 Load Vector Store", type="primary", use_container_width=True):
                 try:
-                    # Force reload the RAG system to pick up existing vector store
-                    st.session_state.rag_system = RAGSystem()
-                    stats = st.session_state.rag_system.get_system_stats()
-                    if stats["vector_store_stats"]["count"] > 0:
+                    # Force reload the shared vector store to pick up existing data
+                    get_retriever.clear()
+                    clear_cached_stats()
+                    st.session_state.rag_system = get_rag_system()
+                    collection_stats = get_collection_stats()
+                    if collection_stats["count"] > 0:
                         st.session_state.documents_ingested = True
-                        st.success(f"✅ Loaded {stats['vector_store_stats']['count']} document chunks!")
+                        st.success(f"✅ Loaded {collection_stats['count']} document chunks!")
                         st.rerun()
                     else:
                         st.error("Vector store exists but appears empty")
@@ -731,21 +718,20 @@ if __name__ == "__main__":
             st.warning("⚠️ No vector store found")
             
             # Check if dataset exists for ingestion
-            dataset_path = Path(__file__).parent.parent / "dataset"
-            if dataset_path.exists() and any(dataset_path.iterdir()):
+            if _DATASET.exists() and any(_DATASET.iterdir()):
                 st.info("📁 Dataset folder found - you can ingest documents")
             else:
                 st.error("❌ No dataset folder found for ingestion")
         
         # Always show ingest button (for re-ingestion or first-time ingestion)
         if st.button("📥 Ingest Documents", type="secondary", use_container_width=True, key="ingest_btn"):
-            dataset_path = Path(__file__).parent.parent / "dataset"
-            if not dataset_path.exists() or not any(dataset_path.iterdir()):
+            if not _DATASET.exists() or not any(_DATASET.iterdir()):
                 st.error("❌ Dataset folder not found or empty. Cannot ingest documents.")
             else:
                 with st.spinner("Processing documents..."):
                     try:
                         result = st.session_state.rag_system.ingest_documents()
+                        clear_cached_stats()
                         if result["success"]:
                             st.success(result["message"])
                             st.session_state.documents_ingested = True
@@ -764,7 +750,7 @@ if __name__ == "__main__":
         
         # System stats
         st.markdown("####  System Statistics")
-        stats = st.session_state.rag_system.get_system_stats()
+        stats = get_system_stats()
         
         col1, col2 = st.columns(2)
         with col1:
@@ -778,7 +764,7 @@ if __name__ == "__main__":
         # Document sources
         if st.session_state.documents_ingested:
             st.markdown("#### 📋 Document Sources")
-            sources = st.session_state.rag_system.get_document_sources()
+            sources = get_document_sources()
             if sources:
                 for source in sources[:5]:  # Show top 5 sources
                     with st.expander(f"📄 {source['name']} ({source['chunks']} chunks)"):
@@ -810,6 +796,7 @@ if __name__ == "__main__":
         with col2:
             if st.button(" Reset System", use_container_width=True):
                 if st.session_state.rag_system.reset_system():
+                    clear_cached_stats()
                     st.session_state.documents_ingested = False
                     st.session_state.chat_history = []
                     st.success("System reset!")
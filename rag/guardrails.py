@@ -0,0 +1,75 @@
+"""Prompt-injection detection shared by document ingestion and answer generation."""
+
+import re
+from typing import Optional
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+
+# Phrases that suggest prompt injection, matched case-insensitively
+INJECTION_PATTERNS = (
+    # Direct instruction overrides
+    "ignore previous instructions",
+    "forget everything above",
+    "disregard the above",
+    "ignore the above",
+    "forget the previous",
+    
+    # Role manipulation
+    "you are now",
+    "act as",
+    "pretend to be",
+    "roleplay as",
+    "assume the role",
+    
+    # System manipulation
+    "new instructions:",
+    "system:",
+    "override",
+    "jailbreak",
+    "break out of",
+    "escape from",
+    
+    # Information extraction attempts
+    "tell me the password",
+    "what is the secret",
+    "reveal the key",
+    "show me the code",
+    "give me access",
+    
+    # Instruction injection
+    "instead, do this:",
+    "but first",
+    "however, please",
+    "actually, ignore that",
+    
+    # Document manipulation
+    "ignore instructions in documents",
+    "don't use the documents",
+    "forget the context",
+    "use your training instead"
+)
+
+# One pass over the text finds any pattern; fall back to a single alternation regex without pyahocorasick
+if ahocorasick is not None:
+    _GUARD_AUTOMATON = ahocorasick.Automaton()
+    for _pattern in INJECTION_PATTERNS:
+        _GUARD_AUTOMATON.add_word(_pattern, _pattern)
+    _GUARD_AUTOMATON.make_automaton()
+else:
+    _GUARD_AUTOMATON = None
+_GUARD_RE = re.compile("|".join(map(re.escape, INJECTION_PATTERNS)))
+
+
+def find_injection_pattern(text_lower: str) -> Optional[str]:
+    """Return an injection pattern found in lowercased text, if any."""
+    if _GUARD_AUTOMATON is not None:
+        for _, pattern in _GUARD_AUTOMATON.iter(text_lower):
+            return pattern
+        return None
+    
+    match = _GUARD_RE.search(text_lower)
+    return match.group(0) if match else None
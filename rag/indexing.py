@@ -1,110 +1,313 @@
 """Document indexing - creates and manages vector embeddings."""
 
 import os
-from typing import List, Dict, Any, Optional
+import json
+import math
+import time
+import sqlite3
+import hashlib
+import uuid
+import asyncio
+import functools
+import itertools
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Tuple
+import numpy as np
+import tiktoken
+from openai import RateLimitError
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
 from langchain_core.documents import Document as LangchainDocument
+from langchain_core.embeddings import Embeddings
 from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import Chroma
 
+from .reranking import get_cross_encoder
+
 
 # Configuration
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "512"))  # Matryoshka-truncated size for new stores
 CHROMA_PERSIST_DIR = "./data/chroma_db"
+EMBEDDING_CACHE_PATH = "./data/embedding_cache.sqlite"
 TOP_K_RETRIEVAL = 8  # Increased to get more documents
 SIMILARITY_THRESHOLD = 0.5  # Lowered threshold to be less restrictive
+SEARCH_CACHE_SIZE = 512
+QUERY_EMBEDDING_CACHE_SIZE = 1024  # Query vectors reused across searches with different k or filters
+QUERY_BATCH_WINDOW = 0.01  # Seconds to wait for concurrent queries to join an embedding request
+QUERY_BATCH_MAX = 32
+SEMANTIC_RERANK_CANDIDATES = 50  # Over-fetch this many vector hits for the cross-encoder to rerank
+EMBEDDING_REQUESTS_PER_MINUTE = int(os.getenv("EMBEDDING_REQUESTS_PER_MINUTE", "3000"))
+INGESTION_PARALLEL_REQUESTS = int(os.getenv("INGESTION_PARALLEL_REQUESTS", "4"))  # Concurrent embedding batches
+INGESTION_WRITE_QUEUE_SIZE = 4  # Embedded batches waiting for the Chroma writer
+CHROMA_WRITE_BATCH_SIZE = 5000  # Documents per Chroma add; its SQLite backend caps a write at ~5.4k
+INGESTION_BATCH_SIZE = min(int(os.getenv("INGESTION_BATCH_SIZE", "2048")), 2048)  # OpenAI caps inputs per request at 2048
+MAX_BATCH_TOKENS = 280_000  # Stay under OpenAI's 300k tokens per embedding request
+
+# HNSW parameters for new collections; l2 keeps the distance scale the score filter expects
+HNSW_COLLECTION_METADATA = {
+    "hnsw:space": "l2",
+    "hnsw:M": 16,
+    "hnsw:construction_ef": 64,
+    "hnsw:search_ef": 64  # Above the largest k retrieval asks for (the SEMANTIC_RERANK_CANDIDATES over-fetch)
+}
+
+
+@functools.lru_cache(maxsize=1)
+def _get_encoding():
+    """Load the embedding model's tokenizer, or None if it is unavailable."""
+    try:
+        return tiktoken.encoding_for_model(EMBEDDING_MODEL)
+    except Exception as e:
+        print(f"Error loading tokenizer, estimating token counts: {e}")
+        return None
+
+
+def _count_tokens(text: str) -> int:
+    """Count embedding tokens in text, falling back to ~4 characters per token."""
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode_ordinary(text))
+
+
+def _iter_batches(documents: Iterable[LangchainDocument]) -> Iterator[List[LangchainDocument]]:
+    """Group documents into batches bounded by both input count and total tokens."""
+    batch = []
+    batch_tokens = 0
+    
+    for doc in documents:
+        doc_tokens = _count_tokens(doc.page_content)
+        if batch and (len(batch) >= INGESTION_BATCH_SIZE or batch_tokens + doc_tokens > MAX_BATCH_TOKENS):
+            yield batch
+            batch = []
+            batch_tokens = 0
+        batch.append(doc)
+        batch_tokens += doc_tokens
+    
+    if batch:
+        yield batch
+
+
+def _chroma_where(metadata_filter: Optional[Dict]) -> Optional[Dict]:
+    """Chroma allows one top-level key per filter, so several keys are combined with $and."""
+    if not metadata_filter:
+        return None
+    if len(metadata_filter) == 1:
+        return metadata_filter
+    return {"$and": [{key: value} for key, value in metadata_filter.items()]}
+
+
+@functools.lru_cache(maxsize=1)
+def _get_ingest_loop() -> asyncio.AbstractEventLoop:
+    """One long-lived event loop for ingestion, so the embeddings' async HTTP pool stays bound to a live loop."""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="ingest-loop", daemon=True).start()
+    return loop
+
+
+class TokenBucket:
+    """Token-bucket rate limiter that only blocks when the bucket runs dry."""
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def consume(self, tokens: float = 1):
+        """Take tokens from the bucket, sleeping until enough have refilled."""
+        tokens = min(tokens, self.capacity)
+        with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                
+                time.sleep((tokens - self.tokens) / self.rate)
+
+
+class EmbeddingCache:
+    """On-disk cache of chunk embeddings keyed by model, dimensions and text."""
+    
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB)")
+    
+    def key(self, text: str, dimensions: Optional[int]) -> bytes:
+        """Content address for a text embedded at the given size."""
+        return hashlib.blake2b(f"{EMBEDDING_MODEL}:{dimensions}\n{text}".encode(), digest_size=16).digest()
+    
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, List[float]]:
+        """Look up cached vectors, returning only the keys that were found."""
+        found = {}
+        with sqlite3.connect(self.path) as conn:
+            # Stay under SQLite's bound-parameter limit
+            for i in range(0, len(keys), 900):
+                chunk = keys[i:i + 900]
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk
+                )
+                for key, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype=np.float32).tolist()
+        return found
+    
+    def put_many(self, vectors: Dict[bytes, List[float]]):
+        """Store freshly computed vectors."""
+        with sqlite3.connect(self.path) as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in vectors.items()]
+            )
+
+
+class QueryEmbeddingBatcher(Embeddings):
+    """Coalesces concurrent embed_query calls from different sessions into one request."""
+    
+    def __init__(self, embeddings: Embeddings, window: float = QUERY_BATCH_WINDOW, max_batch: int = QUERY_BATCH_MAX):
+        self.embeddings = embeddings
+        self.window = window
+        self.max_batch = max_batch
+        self.pending = []
+        self.lock = threading.Lock()
+        # Failed requests raise, so only successful embeddings are cached. Keyed on the
+        # embedding size too, which changes when a store is reset or matched on load.
+        self._cached_embed_query = functools.lru_cache(maxsize=QUERY_EMBEDDING_CACHE_SIZE)(self._embed_query)
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+    
+    def embed_query(self, text: str) -> List[float]:
+        return list(self._cached_embed_query(text, getattr(self.embeddings, "dimensions", None)))
+    
+    def _embed_query(self, text: str, dimensions: Optional[int]) -> Tuple[float, ...]:
+        """Embed one query, sharing a request with any concurrent callers."""
+        future = Future()
+        with self.lock:
+            self.pending.append((text, future))
+            is_first = len(self.pending) == 1
+            is_full = len(self.pending) >= self.max_batch
+        
+        # The first caller in a window waits for others to join, then sends the batch
+        if is_full:
+            self._flush()
+        elif is_first:
+            time.sleep(self.window)
+            self._flush()
+        
+        return tuple(future.result())
+    
+    def _flush(self):
+        """Embed every pending query in one request and hand each caller its vector."""
+        with self.lock:
+            batch, self.pending = self.pending, []
+        
+        if not batch:
+            return
+        
+        try:
+            vectors = self.embeddings.embed_documents([text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        
+        for (_, future), vector in zip(batch, vectors):
+            future.set_result(vector)
 
 
 class VectorStore:
     """Manages vector embeddings and similarity search."""
     
-    def __init__(self):
-        self.embeddings = OpenAIEmbeddings(
+    def __init__(
+        self,
+        embeddings: Optional[Embeddings] = None,
+        persist_directory: str = CHROMA_PERSIST_DIR,
+        embedding_cache: Optional[EmbeddingCache] = None
+    ):
+        self.embeddings = embeddings or OpenAIEmbeddings(
             openai_api_key=OPENAI_API_KEY,
-            model=EMBEDDING_MODEL
+            model=EMBEDDING_MODEL,
+            dimensions=EMBEDDING_DIMENSIONS,
+            chunk_size=INGESTION_BATCH_SIZE
         )
+        self.persist_directory = persist_directory
         self.vector_store = None
+        self.rate_limiter = TokenBucket(
+            rate=EMBEDDING_REQUESTS_PER_MINUTE / 60,
+            capacity=EMBEDDING_REQUESTS_PER_MINUTE
+        )
+        self.query_embeddings = QueryEmbeddingBatcher(self.embeddings)
+        self.embedding_cache = embedding_cache or EmbeddingCache()
+        # Repeated queries skip both the query embedding call and the HNSW lookup
+        self._search_cache = OrderedDict()
+        self._search_cache_lock = threading.Lock()
         self._initialize_vector_store()
     
     def _initialize_vector_store(self):
         """Initialize the vector store."""
         try:
-            if os.path.exists(CHROMA_PERSIST_DIR):
-                self.vector_store = Chroma(
-                    persist_directory=CHROMA_PERSIST_DIR,
-                    embedding_function=self.embeddings
-                )
+            if os.path.exists(self.persist_directory):
+                self.vector_store = self._open_chroma()
+                self._match_collection_dimensions()
                 print(f"Loaded existing vector store with {self.vector_store._collection.count()} documents")
             else:
                 print("No existing vector store found. Will create new one when documents are added.")
         except Exception as e:
             print(f"Error initializing vector store: {e}")
     
-    def add_documents(self, documents: List[LangchainDocument]) -> bool:
+    def _open_chroma(self) -> Chroma:
+        """Open the persisted collection, creating it with tuned HNSW settings if new."""
+        return Chroma(
+            persist_directory=self.persist_directory,
+            embedding_function=self.query_embeddings,
+            collection_metadata=HNSW_COLLECTION_METADATA
+        )
+    
+    def _match_collection_dimensions(self):
+        """Embed queries at the stored vectors' size, so older full-size stores keep working."""
+        sample = self.vector_store._collection.get(limit=1, include=["embeddings"])["embeddings"]
+        if sample is not None and len(sample) > 0 and len(sample[0]) != self.embeddings.dimensions:
+            print(f"Using {len(sample[0])}-dimensional embeddings to match the existing collection")
+            self.embeddings.dimensions = len(sample[0])
+    
+    def add_documents(self, documents: Iterable[LangchainDocument]) -> bool:
         """Add documents to the vector store with batch processing and rate limiting."""
         try:
-            if not documents:
+            documents = iter(documents)
+            first_doc = next(documents, None)
+            if first_doc is None:
                 print("No documents to add")
                 return False
             
-            # ChromaDB batch size limit is around 5000 documents
-            BATCH_SIZE = 1000  # Conservative batch size
-            total_docs = len(documents)
-            
-            print(f"Processing {total_docs} documents in batches of {BATCH_SIZE}...")
+            print(f"Processing documents in batches of up to {INGESTION_BATCH_SIZE}...")
             
             if self.vector_store is None:
-                # Create vector store with first batch
-                first_batch = documents[:BATCH_SIZE]
-                print(f"Creating vector store with first batch of {len(first_batch)} documents...")
-                
-                self.vector_store = Chroma.from_documents(
-                    documents=first_batch,
-                    embedding=self.embeddings,
-                    persist_directory=CHROMA_PERSIST_DIR
-                )
-                
-                print(f"✅ Created vector store with {len(first_batch)} documents")
-                
-                # Process remaining documents in batches
-                remaining_docs = documents[BATCH_SIZE:]
-            else:
-                remaining_docs = documents
+                self.vector_store = self._open_chroma()
+                print("✅ Created vector store")
             
-            # Process remaining documents in batches
-            for i in range(0, len(remaining_docs), BATCH_SIZE):
-                batch = remaining_docs[i:i + BATCH_SIZE]
-                batch_num = (i // BATCH_SIZE) + (1 if self.vector_store else 2)
-                
-                print(f"Processing batch {batch_num}: {len(batch)} documents...")
-                
-                try:
-                    self.vector_store.add_documents(batch)
-                    print(f"✅ Added batch {batch_num} ({len(batch)} documents)")
-                    
-                    # Add delay between batches to avoid rate limiting
-                    if i + BATCH_SIZE < len(remaining_docs):
-                        import time
-                        print("⏳ Waiting 2 seconds to avoid rate limits...")
-                        time.sleep(2)
-                        
-                except Exception as batch_error:
-                    print(f"❌ Error processing batch {batch_num}: {batch_error}")
-                    
-                    # If rate limited, wait and retry
-                    if "rate_limit_exceeded" in str(batch_error):
-                        import time
-                        print("⏳ Rate limit hit, waiting 10 seconds...")
-                        time.sleep(10)
-                        
-                        try:
-                            self.vector_store.add_documents(batch)
-                            print(f"✅ Retry successful for batch {batch_num}")
-                        except Exception as retry_error:
-                            print(f"❌ Retry failed for batch {batch_num}: {retry_error}")
-                            return False
-                    else:
-                        return False
+            batches = _iter_batches(itertools.chain([first_doc], documents))
+            
+            try:
+                total_docs = asyncio.run_coroutine_threadsafe(
+                    self._aembed_and_add(batches), _get_ingest_loop()
+                ).result()
+            except Exception as batch_error:
+                print(f"❌ Error processing batches: {batch_error}")
+                return False
+            finally:
+                self._clear_search_cache()
             
             print(f"🎉 Successfully processed all {total_docs} documents!")
             return True
@@ -113,6 +316,141 @@ class VectorStore:
             print(f"Error adding documents to vector store: {e}")
             return False
     
+    async def _aembed_and_add(self, batches: Iterator[List[LangchainDocument]]) -> int:
+        """Embed batches concurrently as they are produced while a writer drains them into Chroma."""
+        semaphore = asyncio.Semaphore(INGESTION_PARALLEL_REQUESTS)
+        write_queue = asyncio.Queue(maxsize=INGESTION_WRITE_QUEUE_SIZE)
+        write_errors = []
+        
+        async def embed(batch_num: int, batch: List[LangchainDocument]):
+            try:
+                print(f"Processing batch {batch_num}: {len(batch)} documents...")
+                batch = await asyncio.to_thread(self._drop_stored_documents, batch)
+                if not batch:
+                    print(f"✅ Batch {batch_num} already stored")
+                    return
+                
+                embeddings = await self._aembed_with_cache(batch)
+                await write_queue.put((batch_num, batch, embeddings))
+            finally:
+                semaphore.release()
+        
+        async def flush(pending: List[Tuple[int, List[LangchainDocument], List[List[float]]]]):
+            """Write the pending embedded batches to Chroma in one add."""
+            docs = [doc for _, batch, _ in pending for doc in batch]
+            try:
+                await asyncio.to_thread(
+                    self.vector_store._collection.add,
+                    ids=[self._document_id(doc) for doc in docs],
+                    embeddings=[vector for _, _, embeddings in pending for vector in embeddings],
+                    documents=[doc.page_content for doc in docs],
+                    metadatas=[doc.metadata for doc in docs]
+                )
+                batch_nums = ", ".join(str(batch_num) for batch_num, _, _ in pending)
+                print(f"✅ Added batch {batch_nums} ({len(docs)} documents)")
+            except Exception as e:
+                write_errors.append(e)
+            pending.clear()
+        
+        async def write():
+            # Coalesce whatever embedded batches are waiting into writes of up to CHROMA_WRITE_BATCH_SIZE
+            pending = []
+            while (item := await write_queue.get()) is not None:
+                # Keep draining after a failure so producers never block on a full queue
+                if write_errors:
+                    continue
+                
+                pending_docs = sum(len(batch) for _, batch, _ in pending)
+                if pending and pending_docs + len(item[1]) > CHROMA_WRITE_BATCH_SIZE:
+                    await flush(pending)
+                pending.append(item)
+                if write_queue.empty():
+                    await flush(pending)
+        
+        writer = asyncio.create_task(write())
+        
+        tasks = []
+        total_docs = 0
+        try:
+            for batch_num in itertools.count(1):
+                await semaphore.acquire()
+                # Loading and chunking block, so pull the next batch off the event loop
+                batch = await asyncio.to_thread(next, batches, None)
+                if batch is None:
+                    semaphore.release()
+                    break
+                
+                total_docs += len(batch)
+                tasks.append(asyncio.create_task(embed(batch_num, batch)))
+            
+            await asyncio.gather(*tasks)
+        except BaseException as e:
+            # The writer skips everything still queued once an error is recorded
+            write_errors.append(e)
+            raise
+        finally:
+            # The loop outlives this call, so never leave embeds or the writer running
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await write_queue.put(None)
+            await writer
+        
+        if write_errors:
+            raise write_errors[0]
+        
+        return total_docs
+    
+    def _document_id(self, doc: LangchainDocument) -> str:
+        """Stable Chroma id for a chunk, so re-ingesting it is a no-op."""
+        return doc.metadata.get("doc_id") or str(uuid.uuid4())
+    
+    def _drop_stored_documents(self, batch: List[LangchainDocument]) -> List[LangchainDocument]:
+        """Remove chunks whose ids are already in the collection or repeated in the batch."""
+        ids = [self._document_id(doc) for doc in batch]
+        seen = set(self.vector_store._collection.get(ids=ids, include=[])["ids"])
+        
+        new_docs = []
+        for doc_id, doc in zip(ids, batch):
+            if doc_id not in seen:
+                seen.add(doc_id)
+                new_docs.append(doc)
+        
+        return new_docs
+    
+    async def _aembed_with_cache(self, batch: List[LangchainDocument]) -> List[List[float]]:
+        """Embed a batch, reusing cached vectors for chunk texts that were embedded before."""
+        keys = [self.embedding_cache.key(doc.page_content, self.embeddings.dimensions) for doc in batch]
+        vectors = await asyncio.to_thread(self.embedding_cache.get_many, keys)
+        
+        # Repeated boilerplate within the batch is only sent once
+        missing = {}
+        for key, doc in zip(keys, batch):
+            if key not in vectors:
+                missing.setdefault(key, doc)
+        
+        if missing:
+            new_vectors = dict(zip(missing, await self._aembed_batch(list(missing.values()))))
+            await asyncio.to_thread(self.embedding_cache.put_many, new_vectors)
+            vectors.update(new_vectors)
+        
+        return [vectors[key] for key in keys]
+    
+    @retry(
+        retry=retry_if_exception_type(RateLimitError),
+        wait=wait_random_exponential(multiplier=1, max=60),
+        stop=stop_after_attempt(6),
+        reraise=True
+    )
+    async def _aembed_batch(self, batch: List[LangchainDocument]) -> List[List[float]]:
+        """Embed one batch, backing off exponentially on rate limits."""
+        # One embedding request is sent per `chunk_size` texts
+        await asyncio.to_thread(
+            self.rate_limiter.consume,
+            math.ceil(len(batch) / self.embeddings.chunk_size)
+        )
+        return await self.embeddings.aembed_documents([doc.page_content for doc in batch])
+    
     def similarity_search(
         self, 
         query: str, 
@@ -125,39 +463,109 @@ class VectorStore:
             return []
         
         try:
-            docs_with_scores = self.vector_store.similarity_search_with_score(
-                query=query,
-                k=k,
-                filter=filter_metadata
-            )
-            
-            # Be more lenient with similarity scores - return more documents
-            # Lower scores are better in similarity search
-            # Return documents with reasonable similarity (less restrictive filtering)
-            filtered_docs = []
-            for doc, score in docs_with_scores:
-                # Only filter out documents with very high scores (very dissimilar)
-                if score < 1.5:  # More lenient threshold
-                    filtered_docs.append(doc)
-            
-            # If we filtered out too many, return the best ones anyway
-            if len(filtered_docs) < max(3, k//2):
-                filtered_docs = [doc for doc, score in docs_with_scores[:k]]
-            
-            return filtered_docs
+            filter_key = json.dumps(filter_metadata, sort_keys=True)
+            return list(self._cached_search(query, k, filter_key))
             
         except Exception as e:
             print(f"Error during similarity search: {e}")
             return []
     
+    def _cached_search(self, query: str, k: int, filter_key: str) -> Tuple[LangchainDocument, ...]:
+        """LRU over _search keyed on the normalised query; the original text is what gets embedded."""
+        key = (query.strip().lower(), k, filter_key)
+        with self._search_cache_lock:
+            if key in self._search_cache:
+                self._search_cache.move_to_end(key)
+                return self._search_cache[key]
+        
+        # Errors propagate from _search, so failed searches are never cached
+        result = self._search(query, k, filter_key)
+        with self._search_cache_lock:
+            self._search_cache[key] = result
+            if len(self._search_cache) > SEARCH_CACHE_SIZE:
+                self._search_cache.popitem(last=False)
+        return result
+    
+    def _clear_search_cache(self):
+        """Forget cached searches after the collection changes."""
+        with self._search_cache_lock:
+            self._search_cache.clear()
+    
+    def _search(self, query: str, k: int, filter_key: str) -> Tuple[LangchainDocument, ...]:
+        """Run a similarity search against Chroma; errors propagate so they are never cached."""
+        docs_with_scores = self.vector_store.similarity_search_with_score(
+            query=query,
+            k=k,
+            filter=_chroma_where(json.loads(filter_key))
+        )
+        
+        # Be more lenient with similarity scores - return more documents
+        # Lower scores are better in similarity search
+        # Return documents with reasonable similarity (less restrictive filtering)
+        scores = np.fromiter((score for _, score in docs_with_scores), dtype=np.float32, count=len(docs_with_scores))
+        # Only filter out documents with very high scores (very dissimilar)
+        keep = np.flatnonzero(scores < 1.5)  # More lenient threshold
+        filtered_docs = [docs_with_scores[i][0] for i in keep]
+        
+        # If we filtered out too many, return the best ones anyway
+        if len(filtered_docs) < max(3, k//2):
+            filtered_docs = [doc for doc, score in docs_with_scores[:k]]
+        
+        return tuple(filtered_docs)
+    
+    def similarity_search_with_embeddings(
+        self,
+        query: str,
+        k: int = TOP_K_RETRIEVAL,
+        filter_metadata: Optional[Dict] = None
+    ) -> Tuple[List[LangchainDocument], np.ndarray, np.ndarray]:
+        """Nearest chunks with their stored embeddings, plus the query embedding."""
+        empty = ([], np.empty((0, 0), dtype=np.float32), np.empty(0, dtype=np.float32))
+        if self.vector_store is None:
+            print("Vector store not initialized")
+            return empty
+        
+        try:
+            query_vector = np.asarray(self.query_embeddings.embed_query(query), dtype=np.float32)
+            result = self.vector_store._collection.query(
+                query_embeddings=[query_vector.tolist()],
+                n_results=k,
+                where=_chroma_where(filter_metadata),
+                include=["documents", "metadatas", "embeddings"]
+            )
+            docs = [
+                LangchainDocument(page_content=text, metadata=metadata or {})
+                for text, metadata in zip(result["documents"][0], result["metadatas"][0])
+            ]
+            return docs, np.asarray(result["embeddings"][0], dtype=np.float32), query_vector
+            
+        except Exception as e:
+            print(f"Error during similarity search: {e}")
+            return empty
+    
     def get_relevant_documents(
         self,
         query: str,
         k: int = TOP_K_RETRIEVAL,
-        metadata_filter: Optional[Dict] = None
+        metadata_filter: Optional[Dict] = None,
+        rerank: bool = False
     ) -> List[LangchainDocument]:
-        """Get relevant documents for a query."""
-        return self.similarity_search(query, k, metadata_filter)
+        """Get relevant documents for a query, optionally reranked by a cross-encoder."""
+        cross_encoder = get_cross_encoder() if rerank else None
+        if cross_encoder is None:
+            return self.similarity_search(query, k, metadata_filter)
+        
+        candidates = self.similarity_search(query, max(k, SEMANTIC_RERANK_CANDIDATES), metadata_filter)
+        if len(candidates) <= 1:
+            return candidates
+        
+        try:
+            scores = cross_encoder.predict([(query, doc.page_content) for doc in candidates])
+            ranked = np.argsort(-scores, kind="stable")[:k]
+            return [candidates[i] for i in ranked]
+        except Exception as e:
+            print(f"Error in cross-encoder rerank: {e}")
+            return candidates[:k]
     
     def delete_collection(self):
         """Delete the entire vector store collection."""
@@ -165,12 +573,57 @@ class VectorStore:
             if self.vector_store:
                 self.vector_store.delete_collection()
                 self.vector_store = None
+                self._clear_search_cache()
+                self.embeddings.dimensions = EMBEDDING_DIMENSIONS
                 print("Vector store collection deleted")
                 return True
         except Exception as e:
             print(f"Error deleting collection: {e}")
             return False
     
+    def get_all_documents(self) -> List[LangchainDocument]:
+        """Fetch every stored chunk."""
+        if self.vector_store is None:
+            return []
+        
+        try:
+            result = self.vector_store._collection.get(include=["documents", "metadatas"])
+            return [
+                LangchainDocument(page_content=content, metadata=metadata)
+                for content, metadata in zip(result["documents"], result["metadatas"])
+            ]
+        except Exception as e:
+            print(f"Error fetching stored documents: {e}")
+            return []
+    
+    def get_documents_by_source(self, sources: Iterable[str]) -> List[LangchainDocument]:
+        """Fetch every stored chunk belonging to the given source files."""
+        sources = sorted(sources)
+        if self.vector_store is None or not sources:
+            return []
+        
+        try:
+            result = self.vector_store._collection.get(
+                where={"source": {"$in": sources}},
+                include=["documents", "metadatas"]
+            )
+            return [
+                LangchainDocument(page_content=content, metadata=metadata)
+                for content, metadata in zip(result["documents"], result["metadatas"])
+            ]
+        except Exception as e:
+            print(f"Error fetching documents by source: {e}")
+            return []
+    
+    def delete_documents_by_source(self, sources: Iterable[str]):
+        """Remove every stored chunk belonging to the given source files."""
+        sources = sorted(sources)
+        if self.vector_store is None or not sources:
+            return
+        
+        self.vector_store._collection.delete(where={"source": {"$in": sources}})
+        self._clear_search_cache()
+    
     def get_collection_stats(self) -> Dict[str, Any]:
         """Get statistics about the vector store collection."""
         if self.vector_store is None:
@@ -181,7 +634,7 @@ class VectorStore:
             return {
                 "status": "active",
                 "count": count,
-                "persist_directory": CHROMA_PERSIST_DIR
+                "persist_directory": self.persist_directory
             }
         except Exception as e:
             return {"status": "error", "error": str(e), "count": 0}
@@ -206,7 +659,7 @@ class VectorStore:
                 results = self.vector_store.similarity_search(
                     query="",
                     k=limit,
-                    filter=metadata_filter
+                    filter=_chroma_where(metadata_filter)
                 )
             return results
         except Exception as e:
@@ -1,11 +1,15 @@
 """Document ingestion pipeline - loads, cleans, chunks and processes documents."""
 
 import os
+import re
+import sqlite3
 import hashlib
-from typing import List, Dict, Any
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Iterator, Tuple, Iterable, Optional
 from pathlib import Path
 
-import PyPDF2
 from docx import Document as DocxDocument
 import markdown
 from bs4 import BeautifulSoup
@@ -13,107 +17,215 @@ from bs4 import BeautifulSoup
 from langchain_core.documents import Document as LangchainDocument
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
+from .guardrails import find_injection_pattern
+
 
 # Configuration
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 200
 DOCUMENTS_DIR = "./dataset"
+INGEST_N_WORKERS = int(os.getenv("INGEST_N_WORKERS", str(os.cpu_count() or 1)))  # Parallel file loaders
+INGEST_PARALLEL_MIN_FILES = 8  # Smaller uploads load in-process rather than starting a pool
+DOC_ID_BYTES = 6  # 12 hex characters
+INGEST_MANIFEST_PATH = "./data/ingest_manifest.sqlite"
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+_TEXT_SPLITTER = RecursiveCharacterTextSplitter(
+    chunk_size=CHUNK_SIZE,
+    chunk_overlap=CHUNK_OVERLAP,
+    length_function=len,
+    separators=["\n\n", "\n", " ", ""]
+)
+
+
+@functools.lru_cache(maxsize=4096)
+def _split_text(text: str) -> Tuple[str, ...]:
+    """Split cleaned text into chunks, reusing results for repeated pages."""
+    return tuple(_TEXT_SPLITTER.split_text(text))
+
+
+@functools.lru_cache(maxsize=256)
+def _file_id_hasher(source: str):
+    """Hasher pre-fed with a file's source name, copied for each of the file's chunks."""
+    return hashlib.blake2b(source.encode(), digest_size=DOC_ID_BYTES)
+
+
+class IngestManifest:
+    """Tracks which files have been ingested so unchanged ones can be skipped."""
+    
+    def __init__(self, path: str = INGEST_MANIFEST_PATH):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with sqlite3.connect(self.path) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS files "
+                "(path TEXT PRIMARY KEY, mtime REAL, size INTEGER, content_hash TEXT)"
+            )
+    
+    def changed_files(self, file_paths: Iterable[Path]) -> List[Path]:
+        """Return the files that are new or whose content differs from the last ingest."""
+        with sqlite3.connect(self.path) as conn:
+            known = {
+                path: (mtime, size, content_hash)
+                for path, mtime, size, content_hash in conn.execute("SELECT * FROM files")
+            }
+        
+        changed = []
+        for file_path in file_paths:
+            entry = known.get(str(file_path.resolve()))
+            stat = file_path.stat()
+            
+            if entry is None:
+                changed.append(file_path)
+            elif (entry[0], entry[1]) != (stat.st_mtime, stat.st_size):
+                # Touched but possibly identical, so fall back to comparing content
+                if _file_hash(file_path) != entry[2]:
+                    changed.append(file_path)
+        
+        return changed
+    
+    def record(self, file_paths: Iterable[Path]):
+        """Mark files as ingested in their current state."""
+        rows = []
+        for file_path in file_paths:
+            stat = file_path.stat()
+            rows.append((str(file_path.resolve()), stat.st_mtime, stat.st_size, _file_hash(file_path)))
+        
+        with sqlite3.connect(self.path) as conn:
+            conn.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)", rows)
+    
+    def clear(self):
+        """Forget all ingested files."""
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("DELETE FROM files")
 
 
 class DocumentProcessor:
     """Handles document loading, cleaning, and chunking."""
     
     def __init__(self):
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=CHUNK_SIZE,
-            chunk_overlap=CHUNK_OVERLAP,
-            length_function=len,
-            separators=["\n\n", "\n", " ", ""]
-        )
+        self.text_splitter = _TEXT_SPLITTER
     
     def load_documents(self, directory: str = DOCUMENTS_DIR) -> List[LangchainDocument]:
         """Load all documents from the specified directory."""
-        documents = []
+        return list(self.iter_documents(directory))
+    
+    def iter_documents(self, directory: str = DOCUMENTS_DIR) -> Iterator[LangchainDocument]:
+        """Yield document chunks from the specified directory, one file at a time."""
+        return self.iter_files(self.list_files(directory), directory)
+    
+    def list_files(self, directory: str = DOCUMENTS_DIR) -> List[Path]:
+        """List the document files under a directory."""
+        return [
+            file_path for file_path in sorted(Path(directory).rglob("*"))
+            if file_path.is_file() and file_path.name != "GetClever.png"
+        ]
+    
+    def source_name(self, file_path: Path, root: Optional[str] = None) -> str:
+        """Name a file by its path relative to the upload root, so same-named files in different folders stay distinct."""
+        if root is None:
+            return file_path.name
+        return file_path.relative_to(root).as_posix()
+    
+    def iter_files(self, file_paths: List[Path], root: Optional[str] = None) -> Iterator[LangchainDocument]:
+        """Yield document chunks from the given files under root, in order."""
+        sources = [self.source_name(file_path, root) for file_path in file_paths]
+        workers = min(INGEST_N_WORKERS, len(file_paths))
+        if workers <= 1 or len(file_paths) < INGEST_PARALLEL_MIN_FILES:
+            for file_path, source in zip(file_paths, sources):
+                yield from self._load_file(file_path, source)
+        else:
+            # PDFium is not thread-safe and splitting is pure Python, so fan out across processes
+            # Spawn rather than fork: the server's other threads may hold locks a forked child inherits
+            chunksize = max(1, len(file_paths) // (workers * 4))
+            mp_context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as executor:
+                for doc_content in executor.map(_load_file_worker, file_paths, sources, chunksize=chunksize):
+                    yield from doc_content
+    
+    def _load_file(self, file_path: Path, source: str) -> List[LangchainDocument]:
+        """Load a single file, logging and skipping it on failure."""
+        try:
+            documents = list(self._load_single_document(file_path, source))
+        except Exception as e:
+            print(f"Error loading {file_path}: {e}")
+            return []
         
-        for file_path in Path(directory).rglob("*"):
-            if file_path.is_file() and file_path.name != "GetClever.png":
-                try:
-                    doc_content = self._load_single_document(file_path)
-                    if doc_content:
-                        documents.extend(doc_content)
-                except Exception as e:
-                    print(f"Error loading {file_path}: {e}")
+        # Scan for prompt injection once here so queries only need to check the flag
+        for doc in documents:
+            doc.metadata["injection_flag"] = find_injection_pattern(doc.page_content.lower()) is not None
         
         return documents
     
-    def _load_single_document(self, file_path: Path) -> List[LangchainDocument]:
+    def _load_single_document(self, file_path: Path, source: str) -> Iterator[LangchainDocument]:
         """Load a single document based on its file type."""
         file_extension = file_path.suffix.lower()
         
         if file_extension == '.pdf':
-            return self._load_pdf(file_path)
+            yield from self._load_pdf(file_path, source)
         elif file_extension == '.docx':
-            return self._load_docx(file_path)
+            yield from self._load_docx(file_path, source)
         elif file_extension == '.md':
-            return self._load_markdown(file_path)
+            yield from self._load_markdown(file_path, source)
         elif file_extension == '.txt':
-            return self._load_text(file_path)
+            yield from self._load_text(file_path, source)
         else:
             print(f"Unsupported file type: {file_extension}")
-            return []
     
-    def _load_pdf(self, file_path: Path) -> List[LangchainDocument]:
+    def _load_pdf(self, file_path: Path, source: str) -> Iterator[LangchainDocument]:
         """Load PDF document."""
-        documents = []
+        # Imported here so modules that only need the other loaders don't require the PDF backend
+        import pypdfium2 as pdfium
         
-        with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            
-            for page_num, page in enumerate(pdf_reader.pages):
-                text = page.extract_text()
+        pdf = pdfium.PdfDocument(str(file_path))
+        try:
+            for page_num, page in enumerate(pdf):
+                textpage = page.get_textpage()
+                text = textpage.get_text_range()
+                textpage.close()
+                page.close()
+                
                 if text.strip():
                     cleaned_text = self._clean_text(text)
-                    chunks = self.text_splitter.split_text(cleaned_text)
+                    chunks = _split_text(cleaned_text)
                     
                     for chunk_idx, chunk in enumerate(chunks):
                         doc = LangchainDocument(
                             page_content=chunk,
                             metadata={
-                                "source": str(file_path.name),
+                                "source": source,
                                 "page": page_num + 1,
                                 "chunk": chunk_idx + 1,
                                 "file_type": "pdf",
-                                "doc_id": self._generate_doc_id(file_path, page_num, chunk_idx)
+                                "doc_id": self._generate_doc_id(source, page_num, chunk_idx)
                             }
                         )
-                        documents.append(doc)
-        
-        return documents
+                        yield doc
+        finally:
+            pdf.close()
     
-    def _load_docx(self, file_path: Path) -> List[LangchainDocument]:
+    def _load_docx(self, file_path: Path, source: str) -> Iterator[LangchainDocument]:
         """Load DOCX document."""
         doc = DocxDocument(file_path)
         text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
         
         cleaned_text = self._clean_text(text)
-        chunks = self.text_splitter.split_text(cleaned_text)
+        chunks = _split_text(cleaned_text)
         
-        documents = []
         for chunk_idx, chunk in enumerate(chunks):
             doc = LangchainDocument(
                 page_content=chunk,
                 metadata={
-                    "source": str(file_path.name),
+                    "source": source,
                     "chunk": chunk_idx + 1,
                     "file_type": "docx",
-                    "doc_id": self._generate_doc_id(file_path, 0, chunk_idx)
+                    "doc_id": self._generate_doc_id(source, 0, chunk_idx)
                 }
             )
-            documents.append(doc)
-        
-        return documents
+            yield doc
     
-    def _load_markdown(self, file_path: Path) -> List[LangchainDocument]:
+    def _load_markdown(self, file_path: Path, source: str) -> Iterator[LangchainDocument]:
         """Load Markdown document."""
         with open(file_path, 'r', encoding='utf-8') as file:
             md_content = file.read()
@@ -123,56 +235,49 @@ class DocumentProcessor:
         text = soup.get_text()
         
         cleaned_text = self._clean_text(text)
-        chunks = self.text_splitter.split_text(cleaned_text)
+        chunks = _split_text(cleaned_text)
         
-        documents = []
         for chunk_idx, chunk in enumerate(chunks):
             doc = LangchainDocument(
                 page_content=chunk,
                 metadata={
-                    "source": str(file_path.name),
+                    "source": source,
                     "chunk": chunk_idx + 1,
                     "file_type": "markdown",
-                    "doc_id": self._generate_doc_id(file_path, 0, chunk_idx)
+                    "doc_id": self._generate_doc_id(source, 0, chunk_idx)
                 }
             )
-            documents.append(doc)
-        
-        return documents
+            yield doc
     
-    def _load_text(self, file_path: Path) -> List[LangchainDocument]:
+    def _load_text(self, file_path: Path, source: str) -> Iterator[LangchainDocument]:
         """Load plain text document."""
         with open(file_path, 'r', encoding='utf-8') as file:
             text = file.read()
         
         cleaned_text = self._clean_text(text)
-        chunks = self.text_splitter.split_text(cleaned_text)
+        chunks = _split_text(cleaned_text)
         
-        documents = []
         for chunk_idx, chunk in enumerate(chunks):
             doc = LangchainDocument(
                 page_content=chunk,
                 metadata={
-                    "source": str(file_path.name),
+                    "source": source,
                     "chunk": chunk_idx + 1,
                     "file_type": "txt",
-                    "doc_id": self._generate_doc_id(file_path, 0, chunk_idx)
+                    "doc_id": self._generate_doc_id(source, 0, chunk_idx)
                 }
             )
-            documents.append(doc)
-        
-        return documents
+            yield doc
     
     def _clean_text(self, text: str) -> str:
         """Clean and normalize text."""
-        text = " ".join(text.split())
-        text = text.replace('\x00', '')
-        return text.strip()
+        return _WHITESPACE_RE.sub(" ", text.replace('\x00', '')).strip()
     
-    def _generate_doc_id(self, file_path: Path, page: int, chunk: int) -> str:
+    def _generate_doc_id(self, source: str, page: int, chunk: int) -> str:
         """Generate unique document ID."""
-        content = f"{file_path.name}_{page}_{chunk}"
-        return hashlib.md5(content.encode()).hexdigest()[:12]
+        hasher = _file_id_hasher(source).copy()
+        hasher.update(f"_{page}_{chunk}".encode())
+        return hasher.hexdigest()
     
     def get_document_stats(self, documents: List[LangchainDocument]) -> Dict[str, Any]:
         """Get statistics about processed documents."""
@@ -187,4 +292,24 @@ class DocumentProcessor:
             "file_types": list(set(doc.metadata["file_type"] for doc in documents))
         }
         
-        return stats
\ No newline at end of file
+        return stats
+
+
+def _file_hash(file_path: Path) -> str:
+    """Hash a file's bytes."""
+    hasher = hashlib.blake2b()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+_worker_processor = None
+
+
+def _load_file_worker(file_path: Path, source: str) -> List[LangchainDocument]:
+    """Load one file in a worker process, reusing one DocumentProcessor per process."""
+    global _worker_processor
+    if _worker_processor is None:
+        _worker_processor = DocumentProcessor()
+    return _worker_processor._load_file(file_path, source)
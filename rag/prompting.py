@@ -1,14 +1,38 @@
 """Answer generation and prompting - creates responses with citations and safety checks."""
 
 import os
-from typing import List, Dict, Any, Optional
+import re
+import json
+import time
+import asyncio
+import weakref
+import functools
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import List, Dict, Any, Optional, Tuple, Generator, AsyncGenerator
 
+from pathlib import Path
+
+import httpx
+import numpy as np
+import tiktoken
 from langchain_core.documents import Document as LangchainDocument
 from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.globals import get_llm_cache, set_llm_cache
+from langchain_core.load import dumps
+from langchain_core.outputs import ChatGeneration
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
-from .ingestion import DocumentProcessor
+from .guardrails import find_injection_pattern
+from .ingestion import DOCUMENTS_DIR, DocumentProcessor, IngestManifest
 from .indexing import VectorStore
 from .retrieval import AdvancedRetriever
 
@@ -17,29 +41,42 @@ from .retrieval import AdvancedRetriever
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 CHAT_MODEL = "gpt-4o-mini"
 MAX_TOKENS = 1000
-TEMPERATURE = 0.1
+ENABLE_LLM_CACHE = os.getenv("ENABLE_LLM_CACHE", "false").lower() == "true"
+LLM_CACHE_PATH = "./data/llm_cache.db"
+TEMPERATURE = 0.0 if ENABLE_LLM_CACHE else 0.1  # Deterministic answers make cached replies representative
+ENABLE_SEMANTIC_CACHE = os.getenv("ENABLE_SEMANTIC_CACHE", "false").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = 0.92  # Cosine similarity above which two questions share an answer
+SEMANTIC_CACHE_SIZE = 1000
+GUARDRAIL_CACHE_SIZE = 4096  # Retrieved chunks whose guardrail verdict is remembered
+CONTEXT_CACHE_SIZE = 256  # Rendered contexts kept for repeated retrievals
 ENABLE_GUARDRAILS = True
-MAX_PROMPT_LENGTH = 2000
+MAX_PROMPT_LENGTH = 2000  # Longest accepted question, in characters
+MAX_PROMPT_TOKENS = 1500  # System prompt plus answer prompt
 TOP_K_RETRIEVAL = 5
+CONVERSATION_HISTORY_SIZE = 15  # Exchanges kept for follow-up context
+FOLLOWUP_QUERY_CACHE_SIZE = 256
 ENABLE_RERANKING = True
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))  # In-flight async LLM calls per event loop
+OPENAI_MAX_CONNECTIONS = 100
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = 50
+ENABLE_BATCH_PROMPTING = os.getenv("ENABLE_BATCH_PROMPTING", "false").lower() == "true"
+ANSWER_BATCH_WINDOW = 0.015  # Seconds to wait for concurrent questions to share one LLM call
+ANSWER_BATCH_MAX = 4
+ENABLE_JSON_RESPONSES = os.getenv("ENABLE_JSON_RESPONSES", "false").lower() == "true"  # Non-streamed answers only
 
+# Response sections used when streaming only the answer text
+ANSWER_MARKER = "Answer:"
+SECTION_MARKERS = ("\nCitations:", "\nConfidence:")
+SECTION_MARKER_HOLDBACK = max(len(marker) for marker in SECTION_MARKERS)
 
-class AnswerGenerator:
-    """Generates answers with citations and safety checks."""
-    
-    def __init__(self):
-        self.llm = ChatOpenAI(
-            openai_api_key=OPENAI_API_KEY,
-            model_name=CHAT_MODEL,
-            max_tokens=MAX_TOKENS,
-            temperature=TEMPERATURE
-        )
-        
-        self.system_prompt = self._create_system_prompt()
-    
-    def _create_system_prompt(self) -> str:
-        """Create the system prompt for answer generation."""
-        return """You are a helpful AI assistant that answers questions based on provided context documents.
+# Identical prompts to the same model settings are answered from disk
+if ENABLE_LLM_CACHE:
+    from langchain_community.cache import SQLiteCache
+    Path(LLM_CACHE_PATH).parent.mkdir(parents=True, exist_ok=True)
+    set_llm_cache(SQLiteCache(database_path=LLM_CACHE_PATH))
+
+# Instructions sent with every answer request
+SYSTEM_PROMPT = """You are a helpful AI assistant that answers questions based on provided context documents.
 
 CRITICAL INSTRUCTIONS:
 1. ONLY use information from the provided context documents to answer questions
@@ -92,6 +129,440 @@ FORMAT YOUR RESPONSE AS:
 Answer: [Your comprehensive, detailed answer here]
 Citations: [List all sources used]
 Confidence: [High/Medium/Low based on how well the context supports your answer]"""
+
+# Answer prompt guidance for follow-up questions, sent with conversation history
+FOLLOWUP_INSTRUCTIONS = (
+    "CRITICAL FOLLOW-UP INSTRUCTIONS:",
+    "If the current question contains phrases like:",
+    "- 'tell me more about it/that/this'",
+    "- 'explain further' or 'more information'",
+    "- 'what else about...' or 'more details'",
+    "- 'expand on...' or 'additional information'",
+    "- Any reference to 'it', 'that', 'this topic', etc.",
+    "- 'give me examples' or 'show me more'",
+    "- 'how does this work' or 'implementation details'",
+    "",
+    "THEN you MUST:",
+    "1. Look at the conversation history above to identify the main topic",
+    "2. Search the context documents for DIFFERENT/ADDITIONAL information about that same topic",
+    "3. Provide NEW details that weren't covered in the previous answer",
+    "4. Look for: examples, case studies, implementation steps, benefits, challenges, technical details",
+    "5. Start your response with: 'Building on our previous discussion about [topic]...'",
+    "6. Be comprehensive - provide as much relevant new information as possible",
+    ""
+)
+
+# Speaker labels for conversation turns in the answer prompt
+HISTORY_TURN_LABELS = ("Human: ", "Assistant: ")
+
+ANSWER_REQUIREMENTS = (
+    "ANSWER REQUIREMENTS:",
+    "- Provide a CONCISE, focused answer based on the context documents above",
+    "- Keep responses brief (2-4 sentences for simple questions, 1-2 paragraphs for complex ones)",
+    "- Include specific data points only if directly relevant",
+    "- Use bullet points for lists of 3+ items",
+    "- If this is a follow-up question, use the conversation history to understand the context",
+    "- Always include citations and indicate your confidence level",
+    "- Be accurate and helpful while staying concise"
+)
+
+# Shorter closing used when the context had to be truncated
+TRUNCATED_ANSWER_REQUIREMENTS = ("Please provide an answer based on the available context.",)
+
+# Phrases that mark a reply as "no answer" (user-friendly versions)
+NO_ANSWER_PATTERNS = (
+    "i don't have enough information",
+    "i don't currently have the necessary details",
+    "there isn't enough reliable information",
+    "i'm unable to find a clear answer",
+    "i cannot find information",
+    "no information is available",
+    "insufficient information",
+    "not enough information",
+    "i don't know",
+    "i'm not sure",
+    "i cannot determine",
+    "unable to provide",
+    "not available at this time"
+)
+_NO_ANSWER_RE = re.compile("|".join(map(re.escape, NO_ANSWER_PATTERNS)), re.IGNORECASE)
+# Words that make a very short reply likely a "no answer"
+_SHORT_NEGATIVE_RE = re.compile("don't|can't|cannot|unable|insufficient", re.IGNORECASE)
+
+# Phrases that mark a question as a follow-up to the previous exchange
+FOLLOWUP_PATTERNS = (
+    "tell me more", "more about", "explain further", "what else",
+    "more details", "expand on", "additional information",
+    "more info", "tell me about it", "about that", "about this",
+    "give me examples", "show me more", "how does this work",
+    "implementation", "benefits", "challenges", "strategies"
+)
+_FOLLOWUP_RE = re.compile("|".join(map(re.escape, FOLLOWUP_PATTERNS)))
+
+# Topics spotted in the previous question, with the terms they add to a follow-up query
+FOLLOWUP_TOPIC_TERMS = (
+    (("ai", "artificial intelligence"),
+     ("artificial intelligence", "AI", "machine learning", "healthcare AI", "clinical AI", "AI applications", "AI implementation", "AI governance")),
+    (("digital health", "digital transformation"),
+     ("digital health", "digital transformation", "WHO strategy", "implementation", "governance", "interoperability", "data management")),
+    (("data", "analytics"),
+     ("health data", "data governance", "analytics", "GDPR", "privacy", "data sharing", "data standards")),
+    (("who", "world health"),
+     ("WHO", "World Health Organization", "global strategy", "digital health platform", "health systems")),
+    (("strategy", "policy"),
+     ("strategy", "policy", "implementation", "governance", "framework", "guidelines"))
+)
+_FOLLOWUP_TOPIC_OF = {
+    trigger: topic
+    for topic, (triggers, _) in enumerate(FOLLOWUP_TOPIC_TERMS)
+    for trigger in triggers
+}
+# Lookahead so one pass finds every trigger, including overlapping ones
+_FOLLOWUP_TOPIC_RE = re.compile(
+    "(?=(" + "|".join(map(re.escape, sorted(_FOLLOWUP_TOPIC_OF, key=len, reverse=True))) + "))"
+)
+# Words longer than 4 characters, used as key terms from the previous question
+_KEYWORD_RE = re.compile(r"\b[a-zA-Z]{5,}\b")
+
+# Appended to the system prompt when non-streamed answers are requested in JSON mode
+JSON_RESPONSE_INSTRUCTIONS = """
+
+JSON RESPONSES:
+Instead of the response format above, respond with a JSON object of the form:
+{"answer": "<answer>", "citations": ["<source>", ...], "confidence": "high|medium|low"}"""
+
+# Extra arguments for non-streamed answer calls
+ANSWER_LLM_KWARGS = {"response_format": {"type": "json_object"}} if ENABLE_JSON_RESPONSES else {}
+
+# Appended to the system prompt when several questions are answered in one call
+BATCH_PROMPT_INSTRUCTIONS = """
+
+BATCHED QUESTIONS:
+You will receive several independent questions, each with its own ID and its own context.
+Answer each question using ONLY the context given with that question.
+Instead of the response format above, respond with a JSON object of the form:
+{"answers": [{"id": "<question id>", "answer": "<answer>", "citations": ["<source>", ...], "confidence": "high|medium|low"}, ...]}
+Include exactly one entry for every question ID."""
+
+
+def is_no_answer_response(text: str) -> bool:
+    """Check if a response indicates no answer is available."""
+    if _NO_ANSWER_RE.search(text):
+        return True
+    
+    # Additional check: very short responses that are likely "no answer"
+    return len(text.strip()) < 100 and bool(_SHORT_NEGATIVE_RE.search(text))
+
+
+@functools.lru_cache(maxsize=FOLLOWUP_QUERY_CACHE_SIZE)
+def _enhance_followup_query(question: str, last_question: str) -> str:
+    """Add topic terms from the previous question to a follow-up question."""
+    # Check if this looks like a follow-up question
+    if not _FOLLOWUP_RE.search(question.lower()):
+        return question
+    
+    last_question_lower = last_question.lower()
+    enhanced_terms = []
+    
+    # Topic-specific enhancements
+    topics = {_FOLLOWUP_TOPIC_OF[match.group(1)] for match in _FOLLOWUP_TOPIC_RE.finditer(last_question_lower)}
+    for topic in sorted(topics):
+        enhanced_terms.extend(FOLLOWUP_TOPIC_TERMS[topic][1])
+    
+    # Extract key nouns from last question (words longer than 4 characters)
+    key_words = _KEYWORD_RE.findall(last_question_lower)
+    enhanced_terms.extend(key_words[:5])  # Add up to 5 key words
+    
+    if not enhanced_terms:
+        return question
+    
+    # Order-preserving dedup keeps the enhanced query stable for the caches keyed on it
+    unique_terms = list(dict.fromkeys(enhanced_terms))[:8]  # Limit to 8 unique terms
+    return f"{question} {' '.join(unique_terms)}"
+
+
+@functools.lru_cache(maxsize=GUARDRAIL_CACHE_SIZE)
+def _document_injection_pattern(content: str) -> Optional[str]:
+    """Scan a chunk's text once; the same chunks come back for many queries."""
+    return find_injection_pattern(content.lower())
+
+
+# asyncio semaphores are bound to one event loop, so keep one per loop
+_llm_semaphores = weakref.WeakKeyDictionary()
+
+
+def _llm_semaphore() -> asyncio.Semaphore:
+    """Semaphore capping concurrent LLM calls on the running event loop."""
+    loop = asyncio.get_running_loop()
+    semaphore = _llm_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _llm_semaphores[loop] = asyncio.Semaphore(OPENAI_MAX_CONCURRENCY)
+    return semaphore
+
+
+@functools.lru_cache(maxsize=1)
+def _get_chat_encoding():
+    """Load the chat model's tokenizer, or None if it is unavailable."""
+    try:
+        return tiktoken.encoding_for_model(CHAT_MODEL)
+    except Exception as e:
+        print(f"Error loading tokenizer, estimating prompt length: {e}")
+        return None
+
+
+def _count_prompt_tokens(text: str) -> int:
+    """Count chat tokens in text, falling back to ~4 characters per token."""
+    encoding = _get_chat_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode_ordinary(text))
+
+
+def _truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text down to at most max_tokens chat tokens."""
+    encoding = _get_chat_encoding()
+    if encoding is None:
+        return text[:max_tokens * 4]
+    tokens = encoding.encode_ordinary(text)
+    return encoding.decode(tokens[:max_tokens]) if len(tokens) > max_tokens else text
+
+
+@functools.lru_cache(maxsize=CONTEXT_CACHE_SIZE)
+def _render_context(documents: Tuple[Tuple[str, str, Any, str], ...]) -> str:
+    """Render (source, label, value, content) tuples as the numbered context block."""
+    return "\n---\n".join(
+        f"[Document {i}] Source: {source}, {label} {'' if value is None else value}\nContent: {content}\n"
+        for i, (source, label, value, content) in enumerate(documents, 1)
+    )
+
+
+def _json_loads(text: str) -> Any:
+    """Decode JSON with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def _response_fields(data: Any) -> Optional[Dict[str, Any]]:
+    """Normalise a decoded {answer, citations, confidence} object, or None if it is not one."""
+    if not isinstance(data, dict) or "answer" not in data:
+        return None
+    
+    citations = data.get("citations") or []
+    if isinstance(citations, str):
+        citations = [citations]
+    confidence = str(data.get("confidence", "")).strip().lower()
+    
+    return {
+        "answer": str(data["answer"]).strip(),
+        "citations": [str(citation) for citation in citations],
+        "confidence": confidence if confidence in ("high", "medium", "low") else "medium"
+    }
+
+
+def _json_response_fields(response_text: str) -> Optional[Dict[str, Any]]:
+    """Decode a JSON-mode reply, or None if the reply is plain text."""
+    response_text = response_text.strip()
+    if not response_text.startswith("{"):
+        return None
+    try:
+        return _response_fields(_json_loads(response_text))
+    except ValueError:
+        return None
+
+
+@functools.lru_cache(maxsize=8)
+def _instruction_tokens(lines: Tuple[str, ...]) -> int:
+    """Token count of a fixed block of prompt lines, computed once per block."""
+    return _count_prompt_tokens("\n".join(lines))
+
+
+@functools.lru_cache(maxsize=1)
+def _answer_prompt_budget() -> int:
+    """Tokens left for the answer prompt once the system prompt is sent."""
+    return MAX_PROMPT_TOKENS - _count_prompt_tokens(SYSTEM_PROMPT)
+
+
+@functools.lru_cache(maxsize=1)
+def _get_llm() -> ChatOpenAI:
+    """Chat client shared by every generator so sessions reuse pooled connections."""
+    return ChatOpenAI(
+        openai_api_key=OPENAI_API_KEY,
+        model_name=CHAT_MODEL,
+        max_tokens=MAX_TOKENS,
+        temperature=TEMPERATURE,
+        http_client=httpx.Client(
+            limits=httpx.Limits(
+                max_connections=OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS
+            )
+        )
+    )
+
+
+class SemanticCache:
+    """Reuses answers for near-duplicate questions by comparing query embeddings."""
+    
+    def __init__(self, threshold: float = SEMANTIC_CACHE_THRESHOLD, max_entries: int = SEMANTIC_CACHE_SIZE):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        # Retrieval settings -> (normalised query vectors, responses)
+        self.entries = {}
+        self.lock = threading.Lock()
+    
+    def lookup(self, vector: List[float], settings: Tuple) -> Optional[Dict[str, Any]]:
+        """Return the stored response for the most similar earlier question, if close enough."""
+        query = self._normalize(vector)
+        with self.lock:
+            matrix, responses = self.entries.get(settings, (None, []))
+            if matrix is None or matrix.shape[1] != query.shape[0]:
+                return None
+            
+            similarities = matrix @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.threshold:
+                return responses[best]
+        return None
+    
+    def insert(self, vector: List[float], settings: Tuple, response: Dict[str, Any]):
+        """Remember a response, evicting the oldest entry once full."""
+        query = self._normalize(vector)[np.newaxis, :]
+        with self.lock:
+            matrix, responses = self.entries.get(settings, (None, []))
+            if matrix is None or matrix.shape[1] != query.shape[1]:
+                matrix, responses = query, [response]
+            else:
+                matrix = np.vstack([matrix, query])[-self.max_entries:]
+                responses = (responses + [response])[-self.max_entries:]
+            self.entries[settings] = (matrix, responses)
+    
+    def clear(self):
+        """Drop all cached answers, e.g. after the corpus changes."""
+        with self.lock:
+            self.entries = {}
+    
+    def _normalize(self, vector: List[float]) -> np.ndarray:
+        """Scale a vector to unit length so dot products are cosine similarities."""
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm > 0 else array
+
+
+class AnswerStreamParser:
+    """Picks the answer section out of a streamed response as it arrives."""
+    
+    def __init__(self):
+        self.text = ""
+        self.answer_start = None
+        self.emitted = 0
+        self.answer_done = False
+        self.started = False  # Whether any answer text has been emitted yet
+    
+    def feed(self, piece: str) -> str:
+        """Add a streamed piece and return any answer text that is now safe to show."""
+        self.text += piece
+        if self.answer_done:
+            return ""
+        
+        # Wait until we know whether the reply starts with the "Answer:" marker
+        if self.answer_start is None:
+            stripped = self.text.lstrip()
+            if stripped.startswith(ANSWER_MARKER):
+                self.answer_start = len(self.text) - len(stripped) + len(ANSWER_MARKER)
+            elif ANSWER_MARKER.startswith(stripped):
+                return ""
+            else:
+                self.answer_start = 0
+            self.emitted = self.answer_start
+        
+        # Stop streaming once the citations/confidence sections begin
+        section_starts = [
+            pos for pos in (self.text.find(marker, self.answer_start) for marker in SECTION_MARKERS)
+            if pos != -1
+        ]
+        if section_starts:
+            end = min(section_starts)
+            self.answer_done = True
+        else:
+            # Hold back enough text to never emit half of a section marker
+            end = len(self.text) - SECTION_MARKER_HOLDBACK
+        
+        if end <= self.emitted:
+            return ""
+        
+        delta = self.text[self.emitted:end]
+        if not self.started:
+            delta = delta.lstrip()
+            self.started = bool(delta)
+        self.emitted = end
+        return delta
+    
+    def finish(self) -> str:
+        """Return the answer text still held back once the stream has ended."""
+        if self.answer_done:
+            return ""
+        
+        delta = self.text[max(self.emitted, self.answer_start or 0):]
+        if not self.started:
+            delta = delta.lstrip()
+        return delta
+
+
+class AnswerBatcher:
+    """Coalesces concurrent questions from different sessions into one batched LLM call."""
+    
+    def __init__(self, generator: "AnswerGenerator", window: float = ANSWER_BATCH_WINDOW, max_batch: int = ANSWER_BATCH_MAX):
+        self.generator = generator
+        self.window = window
+        self.max_batch = max_batch
+        self.pending = []
+        self.lock = threading.Lock()
+    
+    def generate_answer(self, query: str, context_documents: List[LangchainDocument]) -> Dict[str, Any]:
+        future = Future()
+        with self.lock:
+            self.pending.append((query, context_documents, future))
+            is_first = len(self.pending) == 1
+            is_full = len(self.pending) >= self.max_batch
+        
+        # The first caller in a window waits for others to join, then sends the batch
+        if is_full:
+            self._flush()
+        elif is_first:
+            time.sleep(self.window)
+            self._flush()
+        
+        return future.result()
+    
+    def _flush(self):
+        """Answer every pending question in one call and hand each caller its result."""
+        with self.lock:
+            batch, self.pending = self.pending, []
+        
+        if not batch:
+            return
+        
+        try:
+            results = self.generator.generate_answers_batch([
+                {"id": str(i), "query": query, "documents": documents}
+                for i, (query, documents, _) in enumerate(batch)
+            ])
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        
+        for i, (_, _, future) in enumerate(batch):
+            future.set_result(results[str(i)])
+
+
+class AnswerGenerator:
+    """Generates answers with citations and safety checks."""
+    
+    def __init__(self, llm: Optional[ChatOpenAI] = None):
+        self.llm = llm or _get_llm()
+        
+        self.system_prompt = SYSTEM_PROMPT
     
     def generate_answer(
         self, 
@@ -101,6 +572,220 @@ Confidence: [High/Medium/Low based on how well the context supports your answer]
     ) -> Dict[str, Any]:
         """Generate an answer with citations."""
         
+        early_response, messages = self._build_messages(
+            query, context_documents, conversation_history, json_mode=ENABLE_JSON_RESPONSES
+        )
+        if early_response is not None:
+            return early_response
+        
+        try:
+            # Generate response
+            response = self.llm.invoke(messages, **ANSWER_LLM_KWARGS)
+            answer_text = response.content
+            
+            # Parse the response
+            parsed_response = self._parse_response(answer_text, context_documents)
+            
+            return parsed_response
+            
+        except Exception as e:
+            return self._error_response(e)
+    
+    def generate_answers_batch(self, items: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Answer several independent questions with one LLM call, keyed by each item's id."""
+        results = {}
+        batch = []
+        for item in items:
+            early_response, _ = self._build_messages(item["query"], item["documents"])
+            if early_response is not None:
+                results[item["id"]] = early_response
+            else:
+                batch.append(item)
+        
+        # A lone question gets the regular prompt
+        if len(batch) == 1:
+            item = batch[0]
+            results[item["id"]] = self.generate_answer(item["query"], item["documents"])
+            return results
+        
+        answers = {}
+        if batch:
+            try:
+                # Each question gets the completion room a single answer would have
+                response = self.llm.invoke(
+                    self._batch_messages(batch),
+                    response_format={"type": "json_object"},
+                    max_tokens=MAX_TOKENS * len(batch)
+                )
+                answers = {
+                    str(entry.get("id")): entry
+                    for entry in _json_loads(response.content).get("answers", [])
+                }
+            except Exception as e:
+                print(f"Error in batched answer generation, answering individually: {e}")
+        
+        for item in batch:
+            fields = _response_fields(answers.get(item["id"]))
+            if fields is None:
+                results[item["id"]] = self.generate_answer(item["query"], item["documents"])
+            else:
+                results[item["id"]] = self._structured_response(fields, item["documents"])
+        
+        return results
+    
+    def _batch_messages(self, batch: List[Dict[str, Any]]) -> List:
+        """Build one prompt holding every question in a batch with its own context."""
+        sections = [
+            f"=== Question ID: {item['id']} ===\n"
+            f"Context:\n{self._batch_context(item['query'], item['documents'])}\n\n"
+            f"Question: {item['query']}"
+            for item in batch
+        ]
+        return [
+            SystemMessage(content=self.system_prompt + BATCH_PROMPT_INSTRUCTIONS),
+            HumanMessage(content="\n\n".join(sections))
+        ]
+    
+    def _batch_context(self, query: str, documents: List[LangchainDocument]) -> str:
+        """A question's context, held to the same token budget as a single-question prompt."""
+        context = self._prepare_context(documents)
+        context_limit = _answer_prompt_budget() - _count_prompt_tokens(query) - _instruction_tokens(ANSWER_REQUIREMENTS)
+        if _count_prompt_tokens(context) <= context_limit:
+            return context
+        return self._truncate_context(context, context_limit)
+    
+    async def agenerate_answer(
+        self, 
+        query: str, 
+        context_documents: List[LangchainDocument],
+        conversation_history: Optional[List[Dict]] = None
+    ) -> Dict[str, Any]:
+        """Async variant of ``generate_answer`` for callers serving many users from one event loop."""
+        
+        early_response, messages = self._build_messages(
+            query, context_documents, conversation_history, json_mode=ENABLE_JSON_RESPONSES
+        )
+        if early_response is not None:
+            return early_response
+        
+        try:
+            response = await self._ainvoke(messages, **ANSWER_LLM_KWARGS)
+            return self._parse_response(response.content, context_documents)
+            
+        except Exception as e:
+            return self._error_response(e)
+    
+    async def _ainvoke(self, messages: List, **kwargs):
+        """Call the LLM asynchronously, respecting OPENAI_MAX_CONCURRENCY."""
+        async with _llm_semaphore():
+            return await self.llm.ainvoke(messages, **kwargs)
+    
+    def stream_answer(
+        self, 
+        query: str, 
+        context_documents: List[LangchainDocument],
+        conversation_history: Optional[List[Dict]] = None
+    ) -> Generator[str, None, Dict[str, Any]]:
+        """Yield the answer text as it is generated, returning the parsed response when done."""
+        
+        early_response, messages = self._build_messages(query, context_documents, conversation_history)
+        if early_response is not None:
+            yield early_response["answer"]
+            return early_response
+        
+        try:
+            parser = AnswerStreamParser()
+            
+            llm_cache, cache_key = self._stream_cache(messages)
+            cached = llm_cache.lookup(*cache_key) if llm_cache is not None else None
+            
+            if cached:
+                pieces = [cached[0].text]
+            else:
+                pieces = (chunk.content for chunk in self.llm.stream(messages))
+            
+            for piece in pieces:
+                delta = parser.feed(piece)
+                if delta:
+                    yield delta
+            
+            delta = parser.finish()
+            if delta:
+                yield delta
+            
+            if llm_cache is not None and not cached:
+                llm_cache.update(*cache_key, [ChatGeneration(message=AIMessage(content=parser.text))])
+            
+            return self._parse_response(parser.text, context_documents)
+            
+        except Exception as e:
+            error_response = self._error_response(e)
+            yield error_response["answer"]
+            return error_response
+    
+    async def astream_answer(
+        self, 
+        query: str, 
+        context_documents: List[LangchainDocument],
+        conversation_history: Optional[List[Dict]] = None
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """Async variant of ``stream_answer`` yielding {"delta": text} events, then {"final": response}."""
+        
+        early_response, messages = self._build_messages(query, context_documents, conversation_history)
+        if early_response is not None:
+            yield {"delta": early_response["answer"]}
+            yield {"final": early_response}
+            return
+        
+        try:
+            parser = AnswerStreamParser()
+            
+            llm_cache, cache_key = self._stream_cache(messages)
+            cached = await llm_cache.alookup(*cache_key) if llm_cache is not None else None
+            
+            if cached:
+                delta = parser.feed(cached[0].text)
+                if delta:
+                    yield {"delta": delta}
+            else:
+                async with _llm_semaphore():
+                    async for chunk in self.llm.astream(messages):
+                        delta = parser.feed(chunk.content)
+                        if delta:
+                            yield {"delta": delta}
+            
+            delta = parser.finish()
+            if delta:
+                yield {"delta": delta}
+            
+            if llm_cache is not None and not cached:
+                await llm_cache.aupdate(*cache_key, [ChatGeneration(message=AIMessage(content=parser.text))])
+            
+            yield {"final": self._parse_response(parser.text, context_documents)}
+            
+        except Exception as e:
+            error_response = self._error_response(e)
+            yield {"delta": error_response["answer"]}
+            yield {"final": error_response}
+    
+    def _stream_cache(self, messages: List) -> Tuple[Optional[Any], Optional[Tuple[str, str]]]:
+        """The LLM cache, if enabled, and the key a streamed reply to these messages is stored under."""
+        # llm.stream bypasses the LLM cache, so streamed replies are cached here, keyed on the
+        # serialized prompt and model settings rather than LangChain's private cache key
+        llm_cache = get_llm_cache()
+        if llm_cache is None:
+            return None, None
+        return llm_cache, (dumps(messages), dumps(self.llm))
+    
+    def _build_messages(
+        self, 
+        query: str, 
+        context_documents: List[LangchainDocument],
+        conversation_history: Optional[List[Dict]] = None,
+        json_mode: bool = False
+    ) -> Tuple[Optional[Dict[str, Any]], List]:
+        """Run guardrails and build the chat messages, or return an early response."""
+        
         # Apply guardrails
         if ENABLE_GUARDRAILS:
             guardrail_check = self._check_guardrails(query, context_documents)
@@ -110,7 +795,7 @@ Confidence: [High/Medium/Low based on how well the context supports your answer]
                     "citations": [],
                     "confidence": "low",
                     "warning": guardrail_check["reason"]
-                }
+                }, []
         
         # Prepare context
         context_text = self._prepare_context(context_documents)
@@ -121,54 +806,36 @@ Confidence: [High/Medium/Low based on how well the context supports your answer]
                 "citations": [],
                 "confidence": "low",
                 "sources_used": 0
-            }
+            }, []
         
         # Create the prompt
         prompt = self._create_answer_prompt(query, context_text, conversation_history)
         
-        try:
-            # Generate response
-            messages = [
-                SystemMessage(content=self.system_prompt),
-                HumanMessage(content=prompt)
-            ]
-            
-            response = self.llm.invoke(messages)
-            answer_text = response.content
-            
-            # Parse the response
-            parsed_response = self._parse_response(answer_text, context_documents)
-            
-            return parsed_response
-            
-        except Exception as e:
-            return {
-                "answer": f"I encountered an error while generating the answer: {str(e)}",
-                "citations": [],
-                "confidence": "low",
-                "error": str(e)
-            }
+        system_prompt = self.system_prompt + JSON_RESPONSE_INSTRUCTIONS if json_mode else self.system_prompt
+        messages = [
+            SystemMessage(content=system_prompt),
+            HumanMessage(content=prompt)
+        ]
+        return None, messages
+    
+    def _error_response(self, error: Exception) -> Dict[str, Any]:
+        """Build the response returned when answer generation fails."""
+        return {
+            "answer": f"I encountered an error while generating the answer: {str(error)}",
+            "citations": [],
+            "confidence": "low",
+            "error": str(error)
+        }
     
     def _prepare_context(self, documents: List[LangchainDocument]) -> str:
         """Prepare context from retrieved documents."""
         if not documents:
             return ""
         
-        context_parts = []
-        for i, doc in enumerate(documents, 1):
-            source = doc.metadata.get("source", "Unknown")
-            page = doc.metadata.get("page", "")
-            chunk = doc.metadata.get("chunk", "")
-            
-            if page:
-                source_id = f"{source}, Page {page}"
-            else:
-                source_id = f"{source}, Chunk {chunk}"
-            
-            context_part = f"[Document {i}] Source: {source_id}\nContent: {doc.page_content}\n"
-            context_parts.append(context_part)
-        
-        return "\n---\n".join(context_parts)
+        # Overlapping turns retrieve the same chunks, so reuse the rendered text
+        return _render_context(tuple(
+            (*self._source_location(doc), doc.page_content) for doc in documents
+        ))
     
     def _create_answer_prompt(
         self, 
@@ -178,117 +845,116 @@ Confidence: [High/Medium/Low based on how well the context supports your answer]
     ) -> str:
         """Create the prompt for answer generation."""
         
-        prompt_parts = []
-        
-        # Add conversation history if provided
-        if conversation_history and len(conversation_history) > 0:
-            prompt_parts.append("CONVERSATION HISTORY:")
-            for turn in conversation_history[-4:]:  # Increased to 4 turns for better context
-                question = turn.get('question', '')
-                answer = turn.get('answer', '')
-                if question and answer:
-                    prompt_parts.append(f"Human: {question}")
-                    # Keep more of the answer for better context
-                    if len(answer) > 300:
-                        answer = answer[:300] + "..."
-                    prompt_parts.append(f"Assistant: {answer}")
-            prompt_parts.append("")
-            
+        prompt_budget = _answer_prompt_budget()
+        query_tokens = _count_prompt_tokens(query)
+        turns = self._history_turns(conversation_history, 4)  # 4 turns for better context
+        
+        # Size the full prompt from its parts before formatting anything
+        prompt_tokens = (
+            query_tokens
+            + _count_prompt_tokens(context)
+            + _instruction_tokens(ANSWER_REQUIREMENTS)
+            + sum(
+                _count_prompt_tokens(question) + _count_prompt_tokens(answer[:300])
+                + _instruction_tokens(HISTORY_TURN_LABELS)
+                for question, answer in turns
+            )
+        )
+        if conversation_history:
+            prompt_tokens += _instruction_tokens(FOLLOWUP_INSTRUCTIONS)
+        
+        if prompt_tokens <= prompt_budget:
+            history_lines = self._history_lines(conversation_history, turns, answer_chars=300)
             # Enhanced guidance for follow-up questions
-            prompt_parts.append("CRITICAL FOLLOW-UP INSTRUCTIONS:")
-            prompt_parts.append("If the current question contains phrases like:")
-            prompt_parts.append("- 'tell me more about it/that/this'")
-            prompt_parts.append("- 'explain further' or 'more information'") 
-            prompt_parts.append("- 'what else about...' or 'more details'")
-            prompt_parts.append("- 'expand on...' or 'additional information'")
-            prompt_parts.append("- Any reference to 'it', 'that', 'this topic', etc.")
-            prompt_parts.append("- 'give me examples' or 'show me more'")
-            prompt_parts.append("- 'how does this work' or 'implementation details'")
-            prompt_parts.append("")
-            prompt_parts.append("THEN you MUST:")
-            prompt_parts.append("1. Look at the conversation history above to identify the main topic")
-            prompt_parts.append("2. Search the context documents for DIFFERENT/ADDITIONAL information about that same topic")
-            prompt_parts.append("3. Provide NEW details that weren't covered in the previous answer")
-            prompt_parts.append("4. Look for: examples, case studies, implementation steps, benefits, challenges, technical details")
-            prompt_parts.append("5. Start your response with: 'Building on our previous discussion about [topic]...'")
-            prompt_parts.append("6. Be comprehensive - provide as much relevant new information as possible")
-            prompt_parts.append("")
-        
-        # Add current context and question
-        prompt_parts.extend([
+            if history_lines:
+                history_lines.extend(FOLLOWUP_INSTRUCTIONS)
+            return self._assemble_answer_prompt(query, context, history_lines, ANSWER_REQUIREMENTS)
+        
+        # Too long: keep less history, drop the extra guidance and cut the context to fit
+        base_prompt_tokens = query_tokens + 200  # Space for instructions and formatting
+        if conversation_history:
+            base_prompt_tokens += 100  # Additional space for conversation history
+        
+        truncated_context = self._truncate_context(context, prompt_budget - base_prompt_tokens)
+        
+        return self._assemble_answer_prompt(
+            query,
+            truncated_context,
+            self._history_lines(conversation_history, turns[-2:], answer_chars=100),  # Reduce to 2 turns when truncating
+            TRUNCATED_ANSWER_REQUIREMENTS
+        )
+    
+    def _truncate_context(self, context: str, context_limit: int) -> str:
+        """Cut the context to its token allowance, marking that it was truncated."""
+        if context_limit > 0:
+            return _truncate_to_tokens(context, context_limit) + "\n[Context truncated due to length...]"
+        return _truncate_to_tokens(context, 125) + "\n[Context heavily truncated...]"
+    
+    def _history_turns(self, conversation_history: Optional[List[Dict]], turns: int) -> List[Tuple[str, str]]:
+        """The (question, answer) pairs of the last few conversation turns."""
+        pairs = []
+        for turn in (conversation_history or [])[-turns:]:
+            question = turn.get('question', '')
+            answer = turn.get('answer', '')
+            if question and answer:
+                pairs.append((question, answer))
+        return pairs
+    
+    def _history_lines(
+        self,
+        conversation_history: Optional[List[Dict]],
+        turns: List[Tuple[str, str]],
+        answer_chars: int
+    ) -> List[str]:
+        """Format conversation turns for the answer prompt."""
+        if not conversation_history:
+            return []
+        
+        lines = ["CONVERSATION HISTORY:"]
+        for question, answer in turns:
+            lines.append(f"{HISTORY_TURN_LABELS[0]}{question}")
+            if len(answer) > answer_chars:
+                answer = answer[:answer_chars] + "..."
+            lines.append(f"{HISTORY_TURN_LABELS[1]}{answer}")
+        lines.append("")
+        return lines
+    
+    def _assemble_answer_prompt(self, query: str, context: str, history_lines: List[str], requirements: Tuple[str, ...]) -> str:
+        """Join the prompt sections once."""
+        return "\n".join([
+            *history_lines,
             "CONTEXT DOCUMENTS:",
             context,
             "",
             f"CURRENT QUESTION: {query}",
             "",
-            "ANSWER REQUIREMENTS:",
-            "- Provide a CONCISE, focused answer based on the context documents above",
-            "- Keep responses brief (2-4 sentences for simple questions, 1-2 paragraphs for complex ones)",
-            "- Include specific data points only if directly relevant",
-            "- Use bullet points for lists of 3+ items",
-            "- If this is a follow-up question, use the conversation history to understand the context",
-            "- Always include citations and indicate your confidence level",
-            "- Be accurate and helpful while staying concise"
+            *requirements
         ])
-        
-        full_prompt = "\n".join(prompt_parts)
-        
-        # Truncate if too long
-        if len(full_prompt) > MAX_PROMPT_LENGTH:
-            # Calculate available space for context
-            base_prompt_size = len(query) + 800  # Space for instructions and formatting
-            if conversation_history:
-                base_prompt_size += 400  # Additional space for conversation history
-            
-            context_limit = MAX_PROMPT_LENGTH - base_prompt_size
-            if context_limit > 0:
-                truncated_context = context[:context_limit] + "\n[Context truncated due to length...]"
-            else:
-                truncated_context = context[:500] + "\n[Context heavily truncated...]"
-            
-            # Rebuild with truncated context
-            prompt_parts = []
-            if conversation_history and len(conversation_history) > 0:
-                prompt_parts.append("CONVERSATION HISTORY:")
-                for turn in conversation_history[-2:]:  # Reduce to 2 turns when truncating
-                    question = turn.get('question', '')
-                    answer = turn.get('answer', '')
-                    if question and answer:
-                        prompt_parts.append(f"Human: {question}")
-                        prompt_parts.append(f"Assistant: {answer[:100]}...")
-                prompt_parts.append("")
-            
-            prompt_parts.extend([
-                "CONTEXT DOCUMENTS:",
-                truncated_context,
-                "",
-                f"CURRENT QUESTION: {query}",
-                "",
-                "Please provide an answer based on the available context."
-            ])
-            full_prompt = "\n".join(prompt_parts)
-        
-        return full_prompt
     
     def _parse_response(self, response_text: str, context_documents: List[LangchainDocument]) -> Dict[str, Any]:
         """Parse the LLM response to extract answer, citations, and confidence."""
         
+        # JSON-mode replies are decoded directly; plain-text replies go through the line parser
+        fields = _json_response_fields(response_text)
+        if fields is not None:
+            return self._structured_response(fields, context_documents)
+        
         answer = response_text
         citations = []
         confidence = "medium"
         
         # Check if this is a "no answer" response
-        is_no_answer = self._is_no_answer_response(response_text)
+        is_no_answer = is_no_answer_response(response_text)
         
         try:
-            lines = response_text.split('\n')
             current_section = None
+            answer_parts = []
             
-            for line in lines:
+            for line in response_text.splitlines():
                 line = line.strip()
                 if line.startswith('Answer:'):
                     current_section = 'answer'
-                    answer = line.replace('Answer:', '').strip()
+                    answer_parts = [line.replace('Answer:', '').strip()]
                 elif line.startswith('Citations:'):
                     current_section = 'citations'
                 elif line.startswith('Confidence:'):
@@ -296,10 +962,13 @@ Confidence: [High/Medium/Low based on how well the context supports your answer]
                     if confidence_text in ['high', 'medium', 'low']:
                         confidence = confidence_text
                 elif current_section == 'answer' and line:
-                    answer += ' ' + line
+                    answer_parts.append(line)
                 elif current_section == 'citations' and line:
                     citations.append(line)
             
+            if answer_parts:
+                answer = ' '.join(answer_parts)
+            
             # Only extract citations if this is NOT a no-answer response
             if not is_no_answer:
                 source_citations = self._extract_citations(context_documents)
@@ -331,59 +1000,42 @@ Confidence: [High/Medium/Low based on how well the context supports your answer]
                 "has_substantive_answer": not is_no_answer
             }
     
-    def _is_no_answer_response(self, response_text: str) -> bool:
-        """Check if the response indicates no answer is available."""
-        response_lower = response_text.lower().strip()
-        
-        # Patterns that indicate no answer (user-friendly versions)
-        no_answer_patterns = [
-            "i don't have enough information",
-            "i don't currently have the necessary details",
-            "there isn't enough reliable information",
-            "i'm unable to find a clear answer",
-            "i cannot find information",
-            "no information is available",
-            "insufficient information",
-            "not enough information",
-            "i don't know",
-            "i'm not sure",
-            "i cannot determine",
-            "unable to provide",
-            "not available at this time"
-        ]
+    def _structured_response(self, fields: Dict[str, Any], context_documents: List[LangchainDocument]) -> Dict[str, Any]:
+        """Build the parsed response from already structured answer fields."""
+        is_no_answer = is_no_answer_response(fields["answer"])
         
-        # Check if response contains any no-answer patterns
-        for pattern in no_answer_patterns:
-            if pattern in response_lower:
-                return True
+        # Only fall back to source citations if this is NOT a no-answer response
+        if fields["citations"]:
+            citations = fields["citations"]
+        elif not is_no_answer:
+            citations = self._extract_citations(context_documents)
+        else:
+            citations = []
         
-        # Additional check: very short responses that are likely "no answer"
-        if len(response_lower) < 100 and any(word in response_lower for word in ["don't", "can't", "cannot", "unable", "insufficient"]):
-            return True
-            
-        return False
+        return {
+            "answer": fields["answer"],
+            "citations": citations,
+            "confidence": fields["confidence"],
+            "sources_used": len(context_documents) if not is_no_answer else 0,
+            "context_documents": len(context_documents),
+            "has_substantive_answer": not is_no_answer
+        }
     
     def _extract_citations(self, documents: List[LangchainDocument]) -> List[str]:
         """Extract citation information from documents."""
-        citations = []
-        seen_citations = set()  # Track unique citations to avoid duplicates
-        
-        for doc in documents:
-            source = doc.metadata.get("source", "Unknown")
-            page = doc.metadata.get("page")
-            chunk = doc.metadata.get("chunk")
-            
-            if page:
-                citation = f"Source: {source}, Page: {page}"
-            else:
-                citation = f"Source: {source}, Chunk: {chunk}"
-            
-            # Only add if we haven't seen this exact citation before
-            if citation not in seen_citations:
-                citations.append(citation)
-                seen_citations.add(citation)
-        
-        return citations
+        # Dedup on the location tuples so each citation string is built once
+        return [
+            f"Source: {source}, {label}: {value}"
+            for source, label, value in dict.fromkeys(map(self._source_location, documents))
+        ]
+    
+    def _source_location(self, doc: LangchainDocument) -> Tuple[str, str, Any]:
+        """Where a chunk came from: its source and its page, or its chunk number without one."""
+        source = doc.metadata.get("source", "Unknown")
+        page = doc.metadata.get("page")
+        if page:
+            return source, "Page", page
+        return source, "Chunk", doc.metadata.get("chunk")
     
     def _check_guardrails(self, query: str, documents: List[LangchainDocument]) -> Dict[str, Any]:
         """Check for potential security issues."""
@@ -394,80 +1046,63 @@ Confidence: [High/Medium/Low based on how well the context supports your answer]
                 "reason": "Query too long"
             }
         
-        injection_patterns = [
-            # Direct instruction overrides
-            "ignore previous instructions",
-            "forget everything above",
-            "disregard the above",
-            "ignore the above",
-            "forget the previous",
-            
-            # Role manipulation
-            "you are now",
-            "act as",
-            "pretend to be",
-            "roleplay as",
-            "assume the role",
-            
-            # System manipulation
-            "new instructions:",
-            "system:",
-            "override",
-            "jailbreak",
-            "break out of",
-            "escape from",
-            
-            # Information extraction attempts
-            "tell me the password",
-            "what is the secret",
-            "reveal the key",
-            "show me the code",
-            "give me access",
-            
-            # Instruction injection
-            "instead, do this:",
-            "but first",
-            "however, please",
-            "actually, ignore that",
-            
-            # Document manipulation
-            "ignore instructions in documents",
-            "don't use the documents",
-            "forget the context",
-            "use your training instead"
-        ]
+        pattern = find_injection_pattern(query.lower())
+        if pattern is not None:
+            return {
+                "safe": False,
+                "reason": f"Potential prompt injection detected: {pattern}"
+            }
         
-        query_lower = query.lower()
-        for pattern in injection_patterns:
-            if pattern in query_lower:
+        for doc in documents:
+            flagged = doc.metadata.get("injection_flag")
+            if flagged is None:
+                # Chunks ingested before flagging was added are scanned here instead
+                flagged = _document_injection_pattern(doc.page_content) is not None
+            if flagged:
                 return {
                     "safe": False,
-                    "reason": f"Potential prompt injection detected: {pattern}"
+                    "reason": f"Suspicious content in document: {doc.metadata.get('source', 'Unknown')}"
                 }
         
-        for doc in documents:
-            content_lower = doc.page_content.lower()
-            for pattern in injection_patterns:
-                if pattern in content_lower:
-                    return {
-                        "safe": False,
-                        "reason": f"Suspicious content in document: {doc.metadata.get('source', 'Unknown')}"
-                    }
-        
         return {"safe": True, "reason": "Passed all checks"}
     
     def generate_followup_questions(self, query: str, answer: str, context_documents: List[LangchainDocument]) -> List[str]:
         """Generate follow-up questions that the system can actually answer."""
         try:
             # Check if the original answer was substantive
-            is_no_answer = self._is_no_answer_response(answer)
+            is_no_answer = is_no_answer_response(answer)
             
             if is_no_answer:
                 # If we couldn't answer the original question, suggest questions about topics we DO have info on
-                return self._generate_alternative_questions(query, context_documents)
+                questions = self._generate_alternative_questions(query, context_documents)
             else:
                 # If we answered successfully, suggest deeper questions about the same topic
-                return self._generate_deeper_questions(query, answer, context_documents)
+                questions = self._generate_deeper_questions(query, answer, context_documents)
+            
+            return self._answerable_questions(questions, context_documents)
+            
+        except Exception as e:
+            print(f"Error generating follow-up questions: {str(e)}")
+            return []
+    
+    async def agenerate_followup_questions(self, query: str, answer: str, context_documents: List[LangchainDocument]) -> List[str]:
+        """Async variant of ``generate_followup_questions``.
+        
+        The answerability checks for all candidates run concurrently, so validation
+        costs one extra round trip rather than one per question.
+        """
+        try:
+            if is_no_answer_response(answer):
+                questions = await self._agenerate_alternative_questions(query, context_documents)
+            else:
+                questions = await self._agenerate_deeper_questions(query, answer, context_documents)
+            
+            # Every candidate is checked against the same context snippet, so build it once
+            context_text = self._validation_context(context_documents)
+            answerable = await asyncio.gather(*[
+                self._acan_answer_question(question, context_text) for question in questions
+            ])
+            return [question for question, ok in zip(questions, answerable) if ok]
             
         except Exception as e:
             print(f"Error generating follow-up questions: {str(e)}")
@@ -476,10 +1111,29 @@ Confidence: [High/Medium/Low based on how well the context supports your answer]
     def _generate_deeper_questions(self, query: str, answer: str, context_documents: List[LangchainDocument]) -> List[str]:
         """Generate deeper questions when we successfully answered the original question."""
         try:
-            document_content = "\n\n".join([doc.page_content[:300] for doc in context_documents[:3]])
-            answer_preview = answer[:400] if len(answer) > 400 else answer
+            response = self.llm.invoke(self._deeper_questions_messages(query, answer, context_documents))
+            return self._extract_questions(response.content)
             
-            followup_prompt = f"""Based on the successful answer provided, suggest 3 specific follow-up questions that dive deeper into the same topic using the available document content.
+        except Exception as e:
+            print(f"Error generating deeper questions: {str(e)}")
+            return []
+    
+    async def _agenerate_deeper_questions(self, query: str, answer: str, context_documents: List[LangchainDocument]) -> List[str]:
+        """Async variant of ``_generate_deeper_questions``."""
+        try:
+            response = await self._ainvoke(self._deeper_questions_messages(query, answer, context_documents))
+            return self._extract_questions(response.content)
+            
+        except Exception as e:
+            print(f"Error generating deeper questions: {str(e)}")
+            return []
+    
+    def _deeper_questions_messages(self, query: str, answer: str, context_documents: List[LangchainDocument]) -> List:
+        """Build the prompt asking for deeper questions about a successfully answered topic."""
+        document_content = "\n\n".join([doc.page_content[:300] for doc in context_documents[:3]])
+        answer_preview = answer[:400] if len(answer) > 400 else answer
+        
+        followup_prompt = f"""Based on the successful answer provided, suggest 3 specific follow-up questions that dive deeper into the same topic using the available document content.
 
 Original Question: {query}
 Answer provided: {answer_preview}
@@ -500,24 +1154,36 @@ Format as a simple list:
 2. [Specific deeper question] 
 3. [Specific deeper question]"""
 
-            messages = [
-                SystemMessage(content="Generate deeper follow-up questions based strictly on the provided document content."),
-                HumanMessage(content=followup_prompt)
-            ]
-            
-            response = self.llm.invoke(messages)
+        return [
+            SystemMessage(content="Generate deeper follow-up questions based strictly on the provided document content."),
+            HumanMessage(content=followup_prompt)
+        ]
+    
+    def _generate_alternative_questions(self, query: str, context_documents: List[LangchainDocument]) -> List[str]:
+        """Generate alternative questions when we couldn't answer the original question."""
+        try:
+            response = self.llm.invoke(self._alternative_questions_messages(query, context_documents))
             return self._extract_questions(response.content)
             
         except Exception as e:
-            print(f"Error generating deeper questions: {str(e)}")
+            print(f"Error generating alternative questions: {str(e)}")
             return []
     
-    def _generate_alternative_questions(self, query: str, context_documents: List[LangchainDocument]) -> List[str]:
-        """Generate alternative questions when we couldn't answer the original question."""
+    async def _agenerate_alternative_questions(self, query: str, context_documents: List[LangchainDocument]) -> List[str]:
+        """Async variant of ``_generate_alternative_questions``."""
         try:
-            document_content = "\n\n".join([doc.page_content[:400] for doc in context_documents[:5]])
+            response = await self._ainvoke(self._alternative_questions_messages(query, context_documents))
+            return self._extract_questions(response.content)
             
-            followup_prompt = f"""The user asked: "{query}" but we don't have information to answer it.
+        except Exception as e:
+            print(f"Error generating alternative questions: {str(e)}")
+            return []
+    
+    def _alternative_questions_messages(self, query: str, context_documents: List[LangchainDocument]) -> List:
+        """Build the prompt asking for answerable questions close to an unanswered one."""
+        document_content = "\n\n".join([doc.page_content[:400] for doc in context_documents[:5]])
+        
+        followup_prompt = f"""The user asked: "{query}" but we don't have information to answer it.
 
 Generate follow-up questions based on the original user question and the available document content.
 
@@ -539,17 +1205,10 @@ IMPORTANT:
 - Never suggest questions that cannot be answered from the documents
 - Try to keep the question as near as possible to the original topic, but only suggest those with answers"""
 
-            messages = [
-                SystemMessage(content="When we can't answer the original question, suggest the closest possible questions that we CAN answer from our documents. Try to stay as close to the original topic as possible while ensuring the questions are answerable."),
-                HumanMessage(content=followup_prompt)
-            ]
-            
-            response = self.llm.invoke(messages)
-            return self._extract_questions(response.content)
-            
-        except Exception as e:
-            print(f"Error generating alternative questions: {str(e)}")
-            return []
+        return [
+            SystemMessage(content="When we can't answer the original question, suggest the closest possible questions that we CAN answer from our documents. Try to stay as close to the original topic as possible while ensuring the questions are answerable."),
+            HumanMessage(content=followup_prompt)
+        ]
     
     def _extract_questions(self, response_content: str) -> List[str]:
         """Extract questions from LLM response."""
@@ -562,27 +1221,32 @@ IMPORTANT:
                     questions.append(question)
         return questions[:3]
     
+    def _answerable_questions(self, questions: List[str], context_documents: List[LangchainDocument]) -> List[str]:
+        """Drop suggestions the context cannot answer, checking them all in one concurrent batch."""
+        if not questions:
+            return []
+        
+        # Every candidate is checked against the same context snippet, so build it once
+        context_text = self._validation_context(context_documents)
+        responses = self.llm.batch(
+            [self._can_answer_messages(question, context_text) for question in questions],
+            return_exceptions=True
+        )
+        
+        answerable = []
+        for question, response in zip(questions, responses):
+            if isinstance(response, Exception):
+                print(f"Error validating question: {str(response)}")
+            elif response.content.strip().upper().startswith("YES"):
+                answerable.append(question)
+        return answerable
+    
     def _can_answer_question(self, question: str, context_documents: List[LangchainDocument]) -> bool:
         """Check if a question can be answered using the provided context documents."""
         try:
-            # Create a simple prompt to test if the question can be answered
-            context_text = "\n\n".join([doc.page_content[:500] for doc in context_documents[:3]])  # Use first 3 docs
-            
-            test_prompt = f"""Based ONLY on the following context, can you provide a substantive answer to this question?
-
-Context:
-{context_text}
-
-Question: {question}
-
-Respond with only "YES" if you can provide a good answer, or "NO" if the context doesn't contain enough information."""
-
-            messages = [
-                SystemMessage(content="You are a strict evaluator. Only respond YES if the context clearly contains information to answer the question substantively."),
-                HumanMessage(content=test_prompt)
-            ]
-            
-            response = self.llm.invoke(messages)
+            response = self.llm.invoke(
+                self._can_answer_messages(question, self._validation_context(context_documents))
+            )
             return response.content.strip().upper().startswith("YES")
             
         except Exception as e:
@@ -620,18 +1284,68 @@ Respond with only "YES" if you can provide a good answer, or "NO" if the context
                 ]
             
             return fallback_questions[:3]
+    
+    async def _acan_answer_question(self, question: str, context_text: str) -> bool:
+        """Async variant of ``_can_answer_question``, taking the prepared context snippet."""
+        try:
+            response = await self._ainvoke(self._can_answer_messages(question, context_text))
+            return response.content.strip().upper().startswith("YES")
+            
+        except Exception as e:
+            print(f"Error validating question: {str(e)}")
+            return False
+    
+    def _validation_context(self, context_documents: List[LangchainDocument]) -> str:
+        """Context snippet used to check whether follow-up questions are answerable."""
+        return "\n\n".join([doc.page_content[:500] for doc in context_documents[:3]])  # Use first 3 docs
+    
+    def _can_answer_messages(self, question: str, context_text: str) -> List:
+        """Build the prompt asking whether the context can answer a question."""
+        # Create a simple prompt to test if the question can be answered
+        test_prompt = f"""Based ONLY on the following context, can you provide a substantive answer to this question?
+
+Context:
+{context_text}
+
+Question: {question}
+
+Respond with only "YES" if you can provide a good answer, or "NO" if the context doesn't contain enough information."""
+
+        return [
+            SystemMessage(content="You are a strict evaluator. Only respond YES if the context clearly contains information to answer the question substantively."),
+            HumanMessage(content=test_prompt)
+        ]
 
 
 class RAGSystem:
     """Main RAG system that orchestrates all components."""
     
-    def __init__(self):
+    def __init__(
+        self,
+        vector_store: Optional[VectorStore] = None,
+        retriever: Optional[AdvancedRetriever] = None,
+        semantic_cache: Optional[SemanticCache] = None,
+        answer_batcher: Optional[AnswerBatcher] = None,
+        generator: Optional[AnswerGenerator] = None,
+        ingest_manifest: Optional[IngestManifest] = None
+    ):
         self.document_processor = DocumentProcessor()
-        self.vector_store = VectorStore()
-        self.retriever = AdvancedRetriever(self.vector_store)
-        self.generator = AnswerGenerator()
+        self.ingest_manifest = ingest_manifest or IngestManifest()
+        # Heavy components can be injected so they are shared across sessions
+        self.vector_store = vector_store or VectorStore()
+        self.retriever = retriever or AdvancedRetriever(self.vector_store)
+        self.generator = generator or AnswerGenerator()
+        if ENABLE_SEMANTIC_CACHE:
+            self.semantic_cache = semantic_cache or SemanticCache()
+        else:
+            self.semantic_cache = None
+        if ENABLE_BATCH_PROMPTING:
+            self.answer_batcher = answer_batcher or AnswerBatcher(self.generator)
+        else:
+            self.answer_batcher = None
         
-        self.conversation_history = []
+        self.conversation_history = deque(maxlen=CONVERSATION_HISTORY_SIZE)
+        self.last_response = None
         self.system_stats = {
             "total_queries": 0,
             "successful_answers": 0,
@@ -644,44 +1358,86 @@ class RAGSystem:
             print("Loading documents...")
             # Use default directory if none provided
             if directory_path is None:
-                documents = self.document_processor.load_documents()
-            else:
-                documents = self.document_processor.load_documents(directory_path)
+                directory_path = DOCUMENTS_DIR
+            file_paths = self.document_processor.list_files(directory_path)
             
-            if not documents:
+            if not file_paths:
                 return {
                     "success": False,
                     "message": "No documents found to process",
                     "stats": {}
                 }
             
-            print(f"Processed {len(documents)} document chunks")
-            
-            print("Creating embeddings and storing in vector database...")
-            success = self.vector_store.add_documents(documents)
+            # Unchanged files keep their stored chunks; only new or edited files are re-embedded
+            # Key on paths relative to the upload root so same-named files in different folders stay apart
+            sources = {file_path: self.document_processor.source_name(file_path, directory_path) for file_path in file_paths}
+            changed_sources = {sources[file_path] for file_path in self.ingest_manifest.changed_files(file_paths)}
+            unchanged_sources = set(sources.values()) - changed_sources
+            stored_docs = self.vector_store.get_documents_by_source(unchanged_sources)
+            
+            # Files the manifest remembers but the store has lost are ingested again
+            changed_sources |= unchanged_sources - {doc.metadata.get("source") for doc in stored_docs}
+            changed_paths = [file_path for file_path in file_paths if sources[file_path] in changed_sources]
+            print(f"{len(changed_paths)} new or changed files, {len(file_paths) - len(changed_paths)} unchanged")
+            
+            documents = []
+            if changed_paths:
+                self.vector_store.delete_documents_by_source(changed_sources)
+                document_stream = self.document_processor.iter_files(changed_paths, directory_path)
+                first_doc = next(document_stream, None)
+                
+                if first_doc is not None:
+                    # Embed chunks while later files are still being loaded, keeping
+                    # a reference to each one for the BM25 index and stats
+                    def collect_documents():
+                        for doc in itertools.chain([first_doc], document_stream):
+                            documents.append(doc)
+                            yield doc
+                    
+                    print("Creating embeddings and storing in vector database...")
+                    success = self.vector_store.add_documents(collect_documents())
+                    
+                    print(f"Processed {len(documents)} document chunks")
+                    
+                    if not success:
+                        return {
+                            "success": False,
+                            "message": "Failed to add documents to vector store",
+                            "stats": {}
+                        }
+                
+                self.ingest_manifest.record(changed_paths)
             
-            if not success:
+            all_documents = stored_docs + documents
+            if not all_documents:
                 return {
                     "success": False,
-                    "message": "Failed to add documents to vector store",
+                    "message": "No documents found to process",
                     "stats": {}
                 }
             
             print("Building BM25 index for keyword search...")
-            self.retriever.build_bm25_index(documents)
+            self.retriever.build_bm25_index(all_documents)
+            
+            if self.semantic_cache is not None:
+                self.semantic_cache.clear()
             
-            self.system_stats["documents_processed"] = len(documents)
+            self.system_stats["documents_processed"] = len(all_documents)
             
-            doc_stats = self.document_processor.get_document_stats(documents)
+            doc_stats = self.document_processor.get_document_stats(all_documents)
             vector_stats = self.vector_store.get_collection_stats()
             
+            message = f"Successfully processed {len(documents)} document chunks"
+            if stored_docs:
+                message += f" ({len(stored_docs)} unchanged chunks reused)"
+            
             return {
                 "success": True,
-                "message": f"Successfully processed {len(documents)} document chunks",
+                "message": message,
                 "stats": {
                     "document_stats": doc_stats,
                     "vector_store_stats": vector_stats,
-                    "total_chunks": len(documents)
+                    "total_chunks": len(all_documents)
                 }
             }
             
@@ -709,189 +1465,326 @@ class RAGSystem:
             # Enhance query for follow-up questions
             enhanced_query = self._enhance_followup_query(question)
             
-            print(f"Retrieving relevant documents for: {enhanced_query[:50]}...")
+            conversation_context = self._get_conversation_context(include_conversation_context)
+            settings = (use_hybrid_search, use_reranking, k)
+            query_vector, cached = self._lookup_semantic_cache(
+                question, enhanced_query, conversation_context, metadata_filter, settings
+            )
+            if cached is not None:
+                return self._replay_cached_response(question, cached)
             
-            if use_hybrid_search:
-                relevant_docs = self.retriever.hybrid_retrieve(
-                    enhanced_query, k=k*2, metadata_filter=metadata_filter
-                )
+            relevant_docs = self._retrieve_documents(
+                enhanced_query, use_hybrid_search, use_reranking, metadata_filter, k
+            )
+            
+            if not relevant_docs:
+                return self._no_documents_response()
+            
+            if self.answer_batcher is not None and not conversation_context:
+                # Standalone questions can share an LLM call with other sessions' questions
+                result = self.answer_batcher.generate_answer(question, relevant_docs)
             else:
-                relevant_docs = self.vector_store.get_relevant_documents(
-                    enhanced_query, k=k*2, metadata_filter=metadata_filter
+                result = self.generator.generate_answer(
+                    question,  # Use original question for answer generation
+                    relevant_docs,
+                    conversation_context
                 )
             
-            if not relevant_docs:
-                return {
-                    "answer": "I don't have any relevant information to answer this question.",
-                    "citations": [],
-                    "confidence": "low",
-                    "sources_used": 0,
-                    "retrieved_docs": 0
-                }
+            response = self._finalize_response(
+                question, enhanced_query, result, relevant_docs,
+                use_hybrid_search, use_reranking, k
+            )
+            self._store_semantic_cache(query_vector, settings, response)
+            return response
+            
+        except Exception as e:
+            return self._query_error_response(e)
+    
+    async def aquery(
+        self, 
+        question: str,
+        use_hybrid_search: bool = True,
+        use_reranking: bool = ENABLE_RERANKING,
+        metadata_filter: Optional[Dict] = None,
+        k: int = TOP_K_RETRIEVAL,
+        include_conversation_context: bool = True
+    ) -> Dict[str, Any]:
+        """Async variant of ``query`` for callers serving many users from one event loop."""
+        
+        try:
+            self.system_stats["total_queries"] += 1
             
-            print(f"Retrieved {len(relevant_docs)} documents")
+            # Enhance query for follow-up questions
+            enhanced_query = self._enhance_followup_query(question)
             
-            if use_reranking and len(relevant_docs) > k:
-                print("Reranking documents...")
-                relevant_docs = self.retriever.rerank_documents(
-                    enhanced_query, relevant_docs, top_k=k
-                )
-            else:
-                relevant_docs = relevant_docs[:k]
+            conversation_context = self._get_conversation_context(include_conversation_context)
+            settings = (use_hybrid_search, use_reranking, k)
+            query_vector, cached = await asyncio.to_thread(
+                self._lookup_semantic_cache,
+                question, enhanced_query, conversation_context, metadata_filter, settings
+            )
+            if cached is not None:
+                return self._replay_cached_response(question, cached)
             
-            print(f"Using {len(relevant_docs)} documents for answer generation")
+            relevant_docs = await asyncio.to_thread(
+                self._retrieve_documents,
+                enhanced_query, use_hybrid_search, use_reranking, metadata_filter, k
+            )
             
-            conversation_context = None
-            if include_conversation_context and self.conversation_history:
-                # Use more conversation history for better context
-                conversation_context = self.conversation_history[-5:]
+            if not relevant_docs:
+                return self._no_documents_response()
             
-            result = self.generator.generate_answer(
+            result = await self.generator.agenerate_answer(
                 question,  # Use original question for answer generation
                 relevant_docs,
                 conversation_context
             )
             
-            followup_questions = self.generator.generate_followup_questions(
+            followup_questions = await self.generator.agenerate_followup_questions(
                 question, result.get("answer", ""), relevant_docs
             )
             
-            # Store more detailed conversation history
-            self.conversation_history.append({
-                "question": question,
-                "enhanced_query": enhanced_query,
-                "answer": result.get("answer", ""),
-                "citations": result.get("citations", []),
-                "confidence": result.get("confidence", "medium"),
-                "sources_used": len(relevant_docs),
-                "timestamp": __import__('datetime').datetime.now().isoformat()
-            })
-            
-            # Keep more conversation history for better context
-            if len(self.conversation_history) > 15:
-                self.conversation_history = self.conversation_history[-15:]
-            
-            if result.get("answer") and "don't have" not in result.get("answer", "").lower():
-                self.system_stats["successful_answers"] += 1
-            
-            response = {
-                **result,
-                "retrieved_docs": len(relevant_docs),
-                "followup_questions": followup_questions,
-                "search_method": "hybrid" if use_hybrid_search else "semantic",
-                "reranking_used": use_reranking and len(relevant_docs) > k
-            }
-            
+            response = self._finalize_response(
+                question, enhanced_query, result, relevant_docs,
+                use_hybrid_search, use_reranking, k, followup_questions
+            )
+            self._store_semantic_cache(query_vector, settings, response)
             return response
             
         except Exception as e:
-            return {
-                "answer": f"I encountered an error while processing your question: {str(e)}",
-                "citations": [],
-                "confidence": "low",
-                "error": str(e),
-                "retrieved_docs": 0
-            }
+            return self._query_error_response(e)
     
-    def _enhance_followup_query(self, question: str) -> str:
-        """Enhance follow-up questions with context from conversation history."""
+    def stream_query(
+        self, 
+        question: str,
+        use_hybrid_search: bool = True,
+        use_reranking: bool = ENABLE_RERANKING,
+        metadata_filter: Optional[Dict] = None,
+        k: int = TOP_K_RETRIEVAL,
+        include_conversation_context: bool = True
+    ) -> Generator[str, None, None]:
+        """Process a query, yielding the answer as it is generated.
         
-        # Check if this looks like a follow-up question
-        followup_patterns = [
-            "tell me more", "more about", "explain further", "what else",
-            "more details", "expand on", "additional information",
-            "more info", "tell me about it", "about that", "about this",
-            "give me examples", "show me more", "how does this work",
-            "implementation", "benefits", "challenges", "strategies"
-        ]
+        The full response (same shape as ``query``) is stored on ``last_response``
+        once the generator is exhausted.
+        """
         
-        question_lower = question.lower()
-        is_followup = any(pattern in question_lower for pattern in followup_patterns)
+        try:
+            self.system_stats["total_queries"] += 1
+            
+            # Enhance query for follow-up questions
+            enhanced_query = self._enhance_followup_query(question)
+            
+            conversation_context = self._get_conversation_context(include_conversation_context)
+            settings = (use_hybrid_search, use_reranking, k)
+            query_vector, cached = self._lookup_semantic_cache(
+                question, enhanced_query, conversation_context, metadata_filter, settings
+            )
+            if cached is not None:
+                self.last_response = self._replay_cached_response(question, cached)
+                yield self.last_response["answer"]
+                return
+            
+            relevant_docs = self._retrieve_documents(
+                enhanced_query, use_hybrid_search, use_reranking, metadata_filter, k
+            )
+            
+            if not relevant_docs:
+                self.last_response = self._no_documents_response()
+                yield self.last_response["answer"]
+                return
+            
+            result = yield from self.generator.stream_answer(
+                question,  # Use original question for answer generation
+                relevant_docs,
+                conversation_context
+            )
+            
+            self.last_response = self._finalize_response(
+                question, enhanced_query, result, relevant_docs,
+                use_hybrid_search, use_reranking, k
+            )
+            self._store_semantic_cache(query_vector, settings, self.last_response)
+            
+        except Exception as e:
+            self.last_response = self._query_error_response(e)
+            yield self.last_response["answer"]
+    
+    def _retrieve_documents(
+        self,
+        enhanced_query: str,
+        use_hybrid_search: bool,
+        use_reranking: bool,
+        metadata_filter: Optional[Dict],
+        k: int
+    ) -> List[LangchainDocument]:
+        """Retrieve and optionally rerank the documents used to answer a query."""
+        print(f"Retrieving relevant documents for: {enhanced_query[:50]}...")
         
-        if not is_followup or not self.conversation_history:
-            return question
+        if use_hybrid_search:
+            relevant_docs = self.retriever.hybrid_retrieve(
+                enhanced_query, k=k*2, metadata_filter=metadata_filter
+            )
+        else:
+            relevant_docs = self.vector_store.get_relevant_documents(
+                enhanced_query, k=k*2, metadata_filter=metadata_filter, rerank=use_reranking
+            )
         
-        # Get the last question and answer to understand context
-        last_exchange = self.conversation_history[-1]
-        last_question = last_exchange.get("question", "")
-        last_answer = last_exchange.get("answer", "")
+        if not relevant_docs:
+            return []
         
-        # Extract key topics from the last question and answer
-        enhanced_terms = []
+        print(f"Retrieved {len(relevant_docs)} documents")
         
-        # Topic-specific enhancements
-        if any(term in last_question.lower() for term in ["ai", "artificial intelligence"]):
-            enhanced_terms.extend(["artificial intelligence", "AI", "machine learning", "healthcare AI", "clinical AI", "AI applications", "AI implementation", "AI governance"])
+        # With reranking on, the semantic path was already cross-encoder reranked by the vector store
+        if use_reranking and use_hybrid_search and len(relevant_docs) > k:
+            print("Reranking documents...")
+            relevant_docs = self.retriever.rerank_documents(
+                enhanced_query, relevant_docs, top_k=k
+            )
+        else:
+            relevant_docs = relevant_docs[:k]
         
-        if any(term in last_question.lower() for term in ["digital health", "digital transformation"]):
-            enhanced_terms.extend(["digital health", "digital transformation", "WHO strategy", "implementation", "governance", "interoperability", "data management"])
+        print(f"Using {len(relevant_docs)} documents for answer generation")
+        return relevant_docs
+    
+    def _get_conversation_context(self, include_conversation_context: bool) -> Optional[List[Dict]]:
+        """Get the recent conversation turns passed to the answer generator."""
+        if include_conversation_context and self.conversation_history:
+            # Use more conversation history for better context
+            start = max(0, len(self.conversation_history) - 5)
+            return list(itertools.islice(self.conversation_history, start, None))
+        return None
+    
+    def _finalize_response(
+        self,
+        question: str,
+        enhanced_query: str,
+        result: Dict[str, Any],
+        relevant_docs: List[LangchainDocument],
+        use_hybrid_search: bool,
+        use_reranking: bool,
+        k: int,
+        followup_questions: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """Add follow-ups, record the exchange in history and build the final response."""
+        if followup_questions is None:
+            followup_questions = self.generator.generate_followup_questions(
+                question, result.get("answer", ""), relevant_docs
+            )
         
-        if any(term in last_question.lower() for term in ["data", "analytics"]):
-            enhanced_terms.extend(["health data", "data governance", "analytics", "GDPR", "privacy", "data sharing", "data standards"])
+        self._record_exchange(question, enhanced_query, result, len(relevant_docs))
         
-        if any(term in last_question.lower() for term in ["who", "world health"]):
-            enhanced_terms.extend(["WHO", "World Health Organization", "global strategy", "digital health platform", "health systems"])
+        return {
+            **result,
+            "retrieved_docs": len(relevant_docs),
+            "followup_questions": followup_questions,
+            "search_method": "hybrid" if use_hybrid_search else "semantic",
+            "reranking_used": use_reranking and len(relevant_docs) > k
+        }
+    
+    def _record_exchange(self, question: str, enhanced_query: str, result: Dict[str, Any], sources_used: int):
+        """Append an answered question to the history and update answer stats."""
+        # Store more detailed conversation history; the deque drops the oldest exchange
+        self.conversation_history.append({
+            "question": question,
+            "enhanced_query": enhanced_query,
+            "answer": result.get("answer", ""),
+            "citations": result.get("citations", []),
+            "confidence": result.get("confidence", "medium"),
+            "sources_used": sources_used,
+            "timestamp": __import__('datetime').datetime.now().isoformat()
+        })
         
-        if any(term in last_question.lower() for term in ["strategy", "policy"]):
-            enhanced_terms.extend(["strategy", "policy", "implementation", "governance", "framework", "guidelines"])
+        if result.get("answer") and "don't have" not in result.get("answer", "").lower():
+            self.system_stats["successful_answers"] += 1
+    
+    def _lookup_semantic_cache(
+        self,
+        question: str,
+        enhanced_query: str,
+        conversation_context: Optional[List[Dict]],
+        metadata_filter: Optional[Dict],
+        settings: Tuple
+    ) -> Tuple[Optional[List[float]], Optional[Dict[str, Any]]]:
+        """Look up a cached answer, returning the question embedding for storing a miss later."""
+        # Follow-ups depend on the conversation and filtered queries on the filter,
+        # so only standalone questions are answered from the cache
+        if (
+            self.semantic_cache is None or conversation_context
+            or metadata_filter or enhanced_query != question
+        ):
+            return None, None
+        
+        try:
+            query_vector = self.vector_store.query_embeddings.embed_query(question)
+        except Exception as e:
+            print(f"Error embedding question for semantic cache: {e}")
+            return None, None
         
-        # Extract key nouns from last question (words longer than 4 characters)
-        import re
-        key_words = re.findall(r'\b[a-zA-Z]{5,}\b', last_question.lower())
-        enhanced_terms.extend(key_words[:5])  # Add up to 5 key words
+        return query_vector, self.semantic_cache.lookup(query_vector, settings)
+    
+    def _store_semantic_cache(self, query_vector: Optional[List[float]], settings: Tuple, response: Dict[str, Any]):
+        """Cache a substantive answer for near-duplicate questions."""
+        if query_vector is not None and response.get("has_substantive_answer") and "error" not in response:
+            self.semantic_cache.insert(query_vector, settings, response)
+    
+    def _replay_cached_response(self, question: str, cached: Dict[str, Any]) -> Dict[str, Any]:
+        """Record a semantic cache hit like a fresh answer and return it."""
+        self._record_exchange(question, question, cached, cached.get("retrieved_docs", 0))
+        return {**cached, "cache_hit": True}
+    
+    def _no_documents_response(self) -> Dict[str, Any]:
+        """Build the response returned when retrieval finds nothing."""
+        return {
+            "answer": "I don't have any relevant information to answer this question.",
+            "citations": [],
+            "confidence": "low",
+            "sources_used": 0,
+            "retrieved_docs": 0
+        }
+    
+    def _query_error_response(self, error: Exception) -> Dict[str, Any]:
+        """Build the response returned when query processing fails."""
+        return {
+            "answer": f"I encountered an error while processing your question: {str(error)}",
+            "citations": [],
+            "confidence": "low",
+            "error": str(error),
+            "retrieved_docs": 0
+        }
+    
+    def _enhance_followup_query(self, question: str) -> str:
+        """Enhance follow-up questions with context from conversation history."""
+        if not self.conversation_history:
+            return question
         
-        # Create enhanced query
-        if enhanced_terms:
-            unique_terms = list(set(enhanced_terms))[:8]  # Limit to 8 unique terms
-            enhanced_query = f"{question} {' '.join(unique_terms)}"
-        else:
-            enhanced_query = question
+        # Get the last question to understand context
+        last_question = self.conversation_history[-1].get("question", "")
+        enhanced_query = _enhance_followup_query(question, last_question)
         
-        print(f"Enhanced follow-up query: '{question}' -> '{enhanced_query}'")
+        if enhanced_query != question:
+            print(f"Enhanced follow-up query: '{question}' -> '{enhanced_query}'")
         return enhanced_query
     
     def get_document_sources(self) -> List[Dict[str, Any]]:
         """Get information about all document sources in the system."""
-        try:
-            vector_stats = self.vector_store.get_collection_stats()
-            
-            if vector_stats["count"] == 0:
-                return []
-            
-            sample_docs = self.vector_store.search_by_metadata({}, limit=100)
-            
-            sources = {}
-            for doc in sample_docs:
-                source = doc.metadata.get("source", "Unknown")
-                file_type = doc.metadata.get("file_type", "unknown")
-                
-                if source not in sources:
-                    sources[source] = {
-                        "name": source,
-                        "type": file_type,
-                        "chunks": 0,
-                        "pages": set()
-                    }
-                
-                sources[source]["chunks"] += 1
-                if "page" in doc.metadata:
-                    sources[source]["pages"].add(doc.metadata["page"])
-            
-            source_list = []
-            for source_info in sources.values():
-                source_info["total_pages"] = len(source_info["pages"]) if source_info["pages"] else None
-                source_info.pop("pages")
-                source_list.append(source_info)
-            
-            return sorted(source_list, key=lambda x: x["chunks"], reverse=True)
-            
-        except Exception as e:
-            print(f"Error getting document sources: {e}")
-            return []
+        # Kept on the shared retriever, so every session sees the latest ingest
+        return self.retriever.get_document_sources()
     
-    def get_system_stats(self) -> Dict[str, Any]:
-        """Get system statistics and health information."""
-        vector_stats = self.vector_store.get_collection_stats()
+    def get_system_stats(
+        self,
+        vector_stats: Optional[Dict[str, Any]] = None,
+        source_count: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Get system statistics and health information.
+        
+        Callers that already hold vector store stats or the source count can pass
+        them in to skip the vector store lookups.
+        """
+        if vector_stats is None:
+            vector_stats = self.vector_store.get_collection_stats()
+        if source_count is None:
+            source_count = len(self.get_document_sources())
         
         success_rate = 0
         if self.system_stats["total_queries"] > 0:
@@ -907,19 +1800,23 @@ class RAGSystem:
                 "conversation_history_length": len(self.conversation_history)
             },
             "vector_store_stats": vector_stats,
-            "sources": len(self.get_document_sources())
+            "sources": source_count
         }
     
     def clear_conversation_history(self):
         """Clear the conversation history."""
-        self.conversation_history = []
+        self.conversation_history.clear()
         print("Conversation history cleared")
     
     def reset_system(self):
         """Reset the entire system (clear vector store and history)."""
         try:
             self.vector_store.delete_collection()
-            self.conversation_history = []
+            self.ingest_manifest.clear()
+            self.retriever.clear_bm25_index()
+            if self.semantic_cache is not None:
+                self.semantic_cache.clear()
+            self.conversation_history.clear()
             self.system_stats = {
                 "total_queries": 0,
                 "successful_answers": 0,
@@ -0,0 +1,18 @@
+"""Cross-encoder loading shared by semantic and hybrid reranking."""
+
+import functools
+
+
+# Configuration
+CROSS_ENCODER_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+
+@functools.lru_cache(maxsize=1)
+def get_cross_encoder():
+    """Load the reranking cross-encoder once, or None if it is unavailable."""
+    try:
+        from sentence_transformers import CrossEncoder
+        return CrossEncoder(CROSS_ENCODER_MODEL)
+    except Exception as e:
+        print(f"Error loading cross-encoder, skipping rerank: {e}")
+        return None
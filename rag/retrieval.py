@@ -1,28 +1,146 @@
 """Document retrieval - finds relevant documents for queries with advanced search."""
 
-from typing import List, Dict, Any, Optional
+import os
+import json
+import functools
+import hashlib
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
 from langchain_core.documents import Document as LangchainDocument
-from rank_bm25 import BM25Okapi
 import numpy as np
+from scipy.sparse import csr_matrix, csc_matrix, load_npz, save_npz
 
 from .indexing import VectorStore
+from .reranking import get_cross_encoder
 
 # Configuration
 RERANK_TOP_K = 3
 ENABLE_RERANKING = True
+HYBRID_RERANK_CANDIDATES = 16  # Leading hybrid candidates scored by the cross-encoder
+RERANK_BATCH_SIZE = 32
+RRF_K = 60  # Reciprocal Rank Fusion constant
+MMR_LAMBDA = 0.5  # Relevance versus diversity trade-off for get_diverse_results
+TOKEN_CACHE_SIZE = 4096  # Chunks whose lowercased term sets are kept for term-overlap reranking
+HYBRID_SEARCH_WORKERS = 4  # Threads running vector searches alongside BM25 scoring
+BM25_INDEX_DIR = "./data/bm25_index"  # One .npz matrix and .json vocab per corpus fingerprint
+BM25_K1 = 1.5
+BM25_B = 0.75
+BM25_EPSILON = 0.25  # Floor for negative idf values, as a fraction of the average idf
+
+
+# Vector searches wait on Chroma while BM25 scores in numpy, so the two can overlap
+_SEARCH_EXECUTOR = ThreadPoolExecutor(max_workers=HYBRID_SEARCH_WORKERS, thread_name_prefix="hybrid-search")
+
+
+@functools.lru_cache(maxsize=TOKEN_CACHE_SIZE)
+def _term_set(text: str) -> frozenset:
+    """Lowercased terms of a chunk, computed once per chunk text."""
+    return frozenset(text.lower().split())
+
+
+class SparseBM25:
+    """BM25 Okapi scoring over per-term posting lists, one sparse product per query."""
+    
+    def __init__(self, corpus: List[List[str]], k1: float = BM25_K1, b: float = BM25_B, epsilon: float = BM25_EPSILON):
+        self.vocab = {}
+        
+        # Intern tokens as int32 ids so term counting runs on flat arrays, not str lists
+        token_ids = [
+            np.fromiter((self.vocab.setdefault(token, len(self.vocab)) for token in tokens), dtype=np.int32, count=len(tokens))
+            for tokens in corpus
+        ]
+        doc_len = np.array([len(ids) for ids in token_ids], dtype=np.int64)
+        all_token_ids = np.concatenate(token_ids) if token_ids else np.zeros(0, dtype=np.int32)
+        
+        # Count each (document, term) pair by encoding it as one integer
+        vocab_size = max(len(self.vocab), 1)
+        pairs = np.repeat(np.arange(len(corpus), dtype=np.int64), doc_len) * vocab_size + all_token_ids
+        pairs, term_freqs = np.unique(pairs, return_counts=True)
+        rows = (pairs // vocab_size).astype(np.int32)
+        cols = (pairs % vocab_size).astype(np.int32)
+        term_freqs = term_freqs.astype(np.float64)
+        doc_len = doc_len.astype(np.float64)
+        avgdl = (doc_len.mean() if len(doc_len) else 0.0) or 1.0
+        
+        # Same idf as rank_bm25's BM25Okapi, including the epsilon floor for very common terms
+        doc_freqs = np.bincount(cols, minlength=len(self.vocab))
+        idf = np.log(len(corpus) - doc_freqs + 0.5) - np.log(doc_freqs + 0.5)
+        if len(idf):
+            idf[idf < 0] = epsilon * idf.mean()
+        self.idf = idf
+        
+        # Each nonzero holds a term's full BM25 contribution to one document. Column-major
+        # storage makes each term's column its posting list, so scoring only visits
+        # documents that contain a query term.
+        weights = idf[cols] * term_freqs * (k1 + 1) / (
+            term_freqs + k1 * (1 - b + b * doc_len[rows] / avgdl)
+        )
+        self.matrix = csc_matrix((weights, (rows, cols)), shape=(len(corpus), len(self.vocab)))
+    
+    @classmethod
+    def from_saved(cls, vocab: Dict[str, int], idf: np.ndarray, matrix) -> "SparseBM25":
+        """Rebuild an index from its persisted vocab, idf and weight matrix."""
+        index = cls([])
+        index.vocab = vocab
+        index.idf = idf
+        index.matrix = csc_matrix(matrix)
+        return index
+    
+    def get_scores(self, query_tokens: List[str]) -> np.ndarray:
+        """Score every document against the query tokens."""
+        term_ids = [self.vocab[token] for token in query_tokens if token in self.vocab]
+        if not term_ids:
+            return np.zeros(self.matrix.shape[0])
+        # Repeated query tokens count once per occurrence, as in the full product
+        unique_ids, counts = np.unique(term_ids, return_counts=True)
+        return self.matrix[:, unique_ids] @ counts.astype(np.float64)
+    
+    def get_batch_scores(self, queries_tokens: List[List[str]]) -> np.ndarray:
+        """Score every document against several queries at once, one row per query."""
+        rows, cols = [], []
+        for i, query_tokens in enumerate(queries_tokens):
+            for token in query_tokens:
+                term_id = self.vocab.get(token)
+                if term_id is not None:
+                    rows.append(i)
+                    cols.append(term_id)
+        
+        # Duplicate (query, term) entries are summed, matching repeated query tokens.
+        # The product walks only the posting lists of the query terms.
+        query_matrix = csr_matrix(
+            (np.ones(len(rows)), (rows, cols)), shape=(len(queries_tokens), len(self.vocab))
+        )
+        return (self.matrix @ query_matrix.T).T.toarray()
 
 
 class AdvancedRetriever:
     """Enhanced retriever with reranking and hybrid search capabilities."""
     
-    def __init__(self, vector_store: VectorStore):
+    def __init__(self, vector_store: VectorStore, index_dir: str = BM25_INDEX_DIR):
         self.vector_store = vector_store
         self.bm25_index = None
         self.documents_corpus = []
+        self.index_dir = index_dir
+        self.corpus_fingerprint = None
+        self._metadata_index: Dict[Tuple[str, Any], np.ndarray] = {}
+        self._sources_summary = (None, None)  # (corpus fingerprint, per-source summary)
+        self._load_bm25_index()
     
     def build_bm25_index(self, documents: List[LangchainDocument]):
         """Build BM25 index for keyword search."""
         try:
+            fingerprint = self._corpus_fingerprint(documents)
+            if fingerprint == self.corpus_fingerprint and self.bm25_index is not None:
+                # Same corpus as the current index, so keep it (and its document order)
+                print(f"Reusing BM25 index with {len(documents)} documents")
+                return
+            
+            if self._load_index_files(fingerprint, documents):
+                print(f"Loaded BM25 index with {len(self.documents_corpus)} documents")
+                return
+            
             corpus = []
             self.documents_corpus = documents
             
@@ -30,32 +148,223 @@ class AdvancedRetriever:
                 tokens = doc.page_content.lower().split()
                 corpus.append(tokens)
             
-            self.bm25_index = BM25Okapi(corpus)
+            self.bm25_index = SparseBM25(corpus)
+            self.corpus_fingerprint = fingerprint
+            self._build_metadata_index()
             print(f"Built BM25 index with {len(corpus)} documents")
             
+            self._save_bm25_index()
+            
         except Exception as e:
             print(f"Error building BM25 index: {e}")
     
-    def bm25_search(self, query: str, k: int = 10) -> List[tuple]:
+    def clear_bm25_index(self):
+        """Drop the BM25 index from memory and disk."""
+        self.bm25_index = None
+        self.documents_corpus = []
+        self.corpus_fingerprint = None
+        self._metadata_index = {}
+        self._remove_index_files()
+    
+    def _corpus_fingerprint(self, documents: List[LangchainDocument]) -> str:
+        """Hash the chunk ids and contents that make up the corpus."""
+        hasher = hashlib.blake2b(digest_size=16)
+        for doc in sorted(documents, key=lambda doc: doc.metadata.get('doc_id', '')):
+            hasher.update(doc.metadata.get('doc_id', '').encode())
+            hasher.update(doc.page_content.encode())
+        return hasher.hexdigest()
+    
+    def _index_files(self, fingerprint: str) -> Tuple[Path, Path]:
+        """Matrix and metadata files for the index of one corpus."""
+        index_dir = Path(self.index_dir)
+        return index_dir / f"{fingerprint}.npz", index_dir / f"{fingerprint}.json"
+    
+    def _load_bm25_index(self):
+        """Index the chunks already in the vector store so hybrid search works after a restart."""
+        if self.vector_store is None:
+            return
+        
+        # Keyed on the stored chunks, so a saved index is only reused if it matches them
+        documents = self.vector_store.get_all_documents()
+        if documents:
+            self.build_bm25_index(documents)
+    
+    def _load_index_files(self, fingerprint: str, documents: List[LangchainDocument]) -> bool:
+        """Restore the saved index for this corpus, returning False if there is none."""
+        matrix_path, meta_path = self._index_files(fingerprint)
+        if not (matrix_path.exists() and meta_path.exists()):
+            return False
+        
+        try:
+            # npz without pickles plus JSON, so a file shipped in ./data can't run code on load
+            with open(meta_path, encoding='utf-8') as file:
+                meta = json.load(file)
+            matrix = load_npz(matrix_path)
+            docs_by_id = {doc.metadata.get('doc_id'): doc for doc in documents}
+            corpus = [docs_by_id[doc_id] for doc_id in meta["doc_ids"]]
+            if len(corpus) != matrix.shape[0]:
+                raise ValueError("document count does not match the saved matrix")
+            
+            self.bm25_index = SparseBM25.from_saved(meta["vocab"], np.asarray(meta["idf"]), matrix)
+            self.documents_corpus = corpus
+            self.corpus_fingerprint = fingerprint
+            self._build_metadata_index()
+            return True
+        except Exception as e:
+            print(f"Error loading BM25 index, rebuilding it: {e}")
+            return False
+    
+    def _save_bm25_index(self):
+        """Persist the BM25 index under its corpus fingerprint and drop indexes of older corpora."""
+        try:
+            Path(self.index_dir).mkdir(parents=True, exist_ok=True)
+            matrix_path, meta_path = self._index_files(self.corpus_fingerprint)
+            # Write to temporary files and rename, so readers never see a partial index
+            temp_matrix = matrix_path.with_name(f"{matrix_path.stem}.{os.getpid()}.tmp.npz")
+            temp_meta = meta_path.with_name(f"{meta_path.stem}.{os.getpid()}.tmp.json")
+            save_npz(temp_matrix, self.bm25_index.matrix)
+            with open(temp_meta, 'w', encoding='utf-8') as file:
+                json.dump({
+                    "vocab": self.bm25_index.vocab,
+                    "idf": self.bm25_index.idf.tolist(),
+                    "doc_ids": [doc.metadata.get('doc_id') for doc in self.documents_corpus]
+                }, file)
+            os.replace(temp_matrix, matrix_path)
+            os.replace(temp_meta, meta_path)
+            self._remove_index_files(keep=self.corpus_fingerprint)
+        except Exception as e:
+            print(f"Error saving BM25 index: {e}")
+    
+    def _remove_index_files(self, keep: Optional[str] = None):
+        """Delete saved indexes, except the one for the `keep` fingerprint."""
+        try:
+            for path in Path(self.index_dir).glob("*"):
+                if path.suffix in (".npz", ".json") and path.name.split(".")[0] != keep:
+                    path.unlink(missing_ok=True)
+        except Exception as e:
+            print(f"Error deleting BM25 index: {e}")
+    
+    def _build_metadata_index(self):
+        """Map each (metadata key, value) pair to the corpus positions that carry it."""
+        positions = {}
+        for i, doc in enumerate(self.documents_corpus):
+            for key, value in doc.metadata.items():
+                positions.setdefault((key, value), []).append(i)
+        self._metadata_index = {
+            pair: np.array(indices, dtype=np.int32) for pair, indices in positions.items()
+        }
+    
+    def _metadata_mask(self, metadata_filter: Dict[str, Any]) -> np.ndarray:
+        """Boolean mask of corpus documents matching an equality (or $in) metadata filter."""
+        mask = np.ones(len(self.documents_corpus), dtype=bool)
+        for key, condition in metadata_filter.items():
+            if isinstance(condition, dict) and set(condition) == {"$in"}:
+                values = condition["$in"]
+            elif key.startswith("$") or isinstance(condition, dict):
+                # Other Chroma operators are left to the vector store, so BM25 matches nothing
+                return np.zeros(len(self.documents_corpus), dtype=bool)
+            else:
+                values = [condition]
+            
+            key_mask = np.zeros(len(self.documents_corpus), dtype=bool)
+            for value in values:
+                indices = self._metadata_index.get((key, value))
+                if indices is not None:
+                    key_mask[indices] = True
+            mask &= key_mask
+        return mask
+    
+    def get_document_sources(self) -> List[Dict[str, Any]]:
+        """Get information about all document sources in the system."""
+        try:
+            if self.documents_corpus:
+                return self.get_sources_summary()
+            
+            # No BM25 corpus (e.g. a downloaded store), so sample the vector store
+            if self.vector_store.get_collection_stats()["count"] == 0:
+                return []
+            return self.summarize_sources(self.vector_store.search_by_metadata({}, limit=100))
+            
+        except Exception as e:
+            print(f"Error getting document sources: {e}")
+            return []
+    
+    def get_sources_summary(self) -> List[Dict[str, Any]]:
+        """Per-source summary of the BM25 corpus, recomputed whenever the corpus changes."""
+        # Read the fingerprint before the corpus; a build swaps the corpus first
+        fingerprint = self.corpus_fingerprint
+        summary_fingerprint, summary = self._sources_summary
+        if summary is None or summary_fingerprint != fingerprint:
+            summary = self.summarize_sources(self.documents_corpus)
+            self._sources_summary = (fingerprint, summary)
+        return [dict(source_info) for source_info in summary]
+    
+    def summarize_sources(self, documents: List[LangchainDocument]) -> List[Dict[str, Any]]:
+        """Count chunks and pages per source, most chunks first."""
+        sources = {}
+        for doc in documents:
+            source = doc.metadata.get("source", "Unknown")
+            file_type = doc.metadata.get("file_type", "unknown")
+            
+            if source not in sources:
+                sources[source] = {
+                    "name": source,
+                    "type": file_type,
+                    "chunks": 0,
+                    "pages": set()
+                }
+            
+            sources[source]["chunks"] += 1
+            if "page" in doc.metadata:
+                sources[source]["pages"].add(doc.metadata["page"])
+        
+        source_list = []
+        for source_info in sources.values():
+            source_info["total_pages"] = len(source_info["pages"]) if source_info["pages"] else None
+            source_info.pop("pages")
+            source_list.append(source_info)
+        
+        return sorted(source_list, key=lambda x: x["chunks"], reverse=True)
+    
+    def bm25_search(self, query: str, k: int = 10, metadata_filter: Optional[Dict] = None) -> List[tuple]:
         """Perform BM25 keyword search."""
+        results = self.bm25_search_batch([query], k, metadata_filter)
+        return results[0] if results else []
+    
+    def bm25_search_batch(
+        self,
+        queries: List[str],
+        k: int = 10,
+        metadata_filter: Optional[Dict] = None
+    ) -> List[List[tuple]]:
+        """Perform BM25 keyword search for several queries with one pass over the index."""
         if self.bm25_index is None:
-            return []
+            return [[] for _ in queries]
         
         try:
-            query_tokens = query.lower().split()
-            scores = self.bm25_index.get_scores(query_tokens)
+            scores = self.bm25_index.get_batch_scores([query.lower().split() for query in queries])
+            if metadata_filter:
+                # Zero non-matching documents so they drop out with the other non-hits
+                scores[:, ~self._metadata_mask(metadata_filter)] = 0
             
-            top_indices = np.argsort(scores)[::-1][:k]
-            results = [
-                (self.documents_corpus[i], scores[i]) 
-                for i in top_indices if scores[i] > 0
-            ]
+            results = []
+            for query_scores in scores:
+                # Partition out the top k in linear time, then sort just those
+                if k < len(query_scores):
+                    top_indices = np.argpartition(query_scores, -k)[-k:]
+                else:
+                    top_indices = np.arange(len(query_scores))
+                top_indices = top_indices[np.argsort(query_scores[top_indices])[::-1]]
+                results.append([
+                    (self.documents_corpus[i], query_scores[i])
+                    for i in top_indices if query_scores[i] > 0
+                ])
             
             return results
             
         except Exception as e:
             print(f"Error in BM25 search: {e}")
-            return []
+            return [[] for _ in queries]
     
     def hybrid_retrieve(
         self, 
@@ -66,23 +375,24 @@ class AdvancedRetriever:
     ) -> List[LangchainDocument]:
         """Combine semantic and keyword search results."""
         try:
-            semantic_docs = self.vector_store.similarity_search(
-                query, k=k, filter_metadata=metadata_filter
+            # Run the vector search in the background while BM25 scores on this thread
+            semantic_future = _SEARCH_EXECUTOR.submit(
+                self.vector_store.similarity_search, query, k=k, filter_metadata=metadata_filter
             )
             
-            bm25_results = self.bm25_search(query, k=k)
+            bm25_results = self.bm25_search(query, k=k, metadata_filter=metadata_filter)
+            semantic_docs = semantic_future.result()
             
             if not bm25_results:
                 return semantic_docs
             
-            combined_docs = self._combine_search_results(
+            return self._combine_search_results(
                 semantic_docs, 
                 bm25_results, 
-                semantic_weight
+                semantic_weight,
+                k
             )
             
-            return combined_docs[:k]
-            
         except Exception as e:
             print(f"Error in hybrid retrieval: {e}")
             return self.vector_store.similarity_search(query, k, metadata_filter)
@@ -91,56 +401,27 @@ class AdvancedRetriever:
         self, 
         semantic_docs: List[LangchainDocument], 
         bm25_results: List[tuple],
-        semantic_weight: float
+        semantic_weight: float,
+        k: Optional[int] = None
     ) -> List[LangchainDocument]:
-        """Combine and score results from different search methods."""
-        doc_scores = {}
-        
-        # Score semantic results
-        for i, doc in enumerate(semantic_docs):
-            doc_id = doc.metadata.get('doc_id', str(i))
-            semantic_score = 1.0 / (i + 1)
-            doc_scores[doc_id] = {
-                'doc': doc,
-                'semantic_score': semantic_score,
-                'bm25_score': 0.0
-            }
-        
-        # Score BM25 results
-        max_bm25_score = max([score for _, score in bm25_results]) if bm25_results else 1.0
-        
-        for doc, bm25_score in bm25_results:
-            doc_id = doc.metadata.get('doc_id', 'unknown')
-            normalized_bm25 = bm25_score / max_bm25_score if max_bm25_score > 0 else 0
-            
-            if doc_id in doc_scores:
-                doc_scores[doc_id]['bm25_score'] = normalized_bm25
-            else:
-                doc_scores[doc_id] = {
-                    'doc': doc,
-                    'semantic_score': 0.0,
-                    'bm25_score': normalized_bm25
-                }
+        """Fuse the two rankings with weighted Reciprocal Rank Fusion, keeping the top k."""
+        docs = {}
+        scores = {}
         
-        # Calculate combined scores
-        for doc_id in doc_scores:
-            semantic_score = doc_scores[doc_id]['semantic_score']
-            bm25_score = doc_scores[doc_id]['bm25_score']
-            
-            combined_score = (
-                semantic_weight * semantic_score + 
-                (1 - semantic_weight) * bm25_score
-            )
-            doc_scores[doc_id]['combined_score'] = combined_score
+        # Only ranks matter, so BM25 scores need no normalisation
+        for rank, doc in enumerate(semantic_docs, 1):
+            doc_id = doc.metadata.get('doc_id', str(rank - 1))
+            docs[doc_id] = doc
+            scores[doc_id] = semantic_weight / (RRF_K + rank)
         
-        # Sort by combined score
-        sorted_docs = sorted(
-            doc_scores.values(), 
-            key=lambda x: x['combined_score'], 
-            reverse=True
-        )
+        for rank, (doc, _) in enumerate(bm25_results, 1):
+            doc_id = doc.metadata.get('doc_id', 'unknown')
+            docs.setdefault(doc_id, doc)
+            scores[doc_id] = scores.get(doc_id, 0.0) + (1 - semantic_weight) / (RRF_K + rank)
         
-        return [item['doc'] for item in sorted_docs]
+        # Bounded heap instead of sorting every candidate; ties keep first-seen order like sorted()
+        top_ids = heapq.nlargest(k if k is not None else len(scores), scores, key=scores.__getitem__)
+        return [docs[doc_id] for doc_id in top_ids]
     
     def rerank_documents(
         self, 
@@ -152,12 +433,34 @@ class AdvancedRetriever:
         if not ENABLE_RERANKING or len(documents) <= top_k:
             return documents[:top_k]
         
+        cross_encoder = get_cross_encoder()
+        if cross_encoder is None:
+            return self._rerank_by_term_overlap(query, documents, top_k)
+        
+        try:
+            candidates = documents[:max(top_k, HYBRID_RERANK_CANDIDATES)]
+            scores = cross_encoder.predict(
+                [(query, doc.page_content) for doc in candidates], batch_size=RERANK_BATCH_SIZE
+            )
+            ranked = np.argsort(-scores, kind="stable")[:top_k]
+            return [candidates[i] for i in ranked]
+        except Exception as e:
+            print(f"Error in cross-encoder reranking, using term overlap: {e}")
+            return self._rerank_by_term_overlap(query, documents, top_k)
+    
+    def _rerank_by_term_overlap(
+        self,
+        query: str,
+        documents: List[LangchainDocument],
+        top_k: int
+    ) -> List[LangchainDocument]:
+        """Rerank by the share of query terms each document contains."""
         try:
             scored_docs = []
             query_terms = set(query.lower().split())
             
             for doc in documents:
-                content_terms = set(doc.page_content.lower().split())
+                content_terms = _term_set(doc.page_content)
                 
                 overlap = len(query_terms.intersection(content_terms))
                 total_terms = len(query_terms)
@@ -187,19 +490,8 @@ class AdvancedRetriever:
         """Retrieve documents with metadata filtering."""
         try:
             if use_hybrid:
-                docs = self.hybrid_retrieve(query, k=k*2)
-                
-                filtered_docs = []
-                for doc in docs:
-                    match = True
-                    for key, value in metadata_filters.items():
-                        if doc.metadata.get(key) != value:
-                            match = False
-                            break
-                    if match:
-                        filtered_docs.append(doc)
-                
-                return filtered_docs[:k]
+                # Both the vector store and BM25 apply the filter, so no over-fetching is needed
+                return self.hybrid_retrieve(query, k=k, metadata_filter=metadata_filters)
             else:
                 return self.vector_store.similarity_search(
                     query, k=k, filter_metadata=metadata_filters
@@ -213,36 +505,29 @@ class AdvancedRetriever:
         self, 
         query: str, 
         k: int = 10,
-        diversity_threshold: float = 0.8
+        lambda_mult: float = MMR_LAMBDA
     ) -> List[LangchainDocument]:
-        """Get diverse results to avoid redundancy."""
-        candidates = self.vector_store.similarity_search(query, k=k*2)
+        """Get diverse results with Maximal Marginal Relevance over the chunk embeddings."""
+        candidates, embeddings, query_vector = self.vector_store.similarity_search_with_embeddings(query, k=k*2)
         
         if len(candidates) <= k:
             return candidates
         
-        diverse_docs = [candidates[0]]
+        # Cosine similarities to the query and between every pair of candidates
+        embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        query_vector = query_vector / max(np.linalg.norm(query_vector), 1e-12)
+        query_similarity = embeddings @ query_vector
+        pair_similarity = embeddings @ embeddings.T
         
-        for candidate in candidates[1:]:
-            is_diverse = True
-            candidate_words = set(candidate.page_content.lower().split())
-            
-            for selected_doc in diverse_docs:
-                selected_words = set(selected_doc.page_content.lower().split())
-                
-                intersection = len(candidate_words.intersection(selected_words))
-                union = len(candidate_words.union(selected_words))
-                
-                if union > 0:
-                    similarity = intersection / union
-                    if similarity > diversity_threshold:
-                        is_diverse = False
-                        break
-            
-            if is_diverse:
-                diverse_docs.append(candidate)
-                
-            if len(diverse_docs) >= k:
-                break
+        selected = [int(np.argmax(query_similarity))]
+        # Highest similarity of each candidate to anything already selected
+        redundancy = pair_similarity[selected[0]].copy()
+        
+        while len(selected) < k:
+            scores = lambda_mult * query_similarity - (1 - lambda_mult) * redundancy
+            scores[selected] = -np.inf
+            best = int(np.argmax(scores))
+            selected.append(best)
+            np.maximum(redundancy, pair_similarity[best], out=redundancy)
         
-        return diverse_docs
\ No newline at end of file
+        return [candidates[i] for i in selected]
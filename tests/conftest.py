@@ -0,0 +1,82 @@
+"""Shared fakes for the OpenAI clients, so tests build real components without network access."""
+
+import hashlib
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document as LangchainDocument
+from langchain_core.embeddings import Embeddings
+
+from rag.indexing import EmbeddingCache, VectorStore
+from rag.retrieval import AdvancedRetriever
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic pseudo-random unit vectors per text, with the attributes VectorStore reads."""
+
+    def __init__(self, dimensions=16):
+        self.dimensions = dimensions
+        self.chunk_size = 2048
+        self.requests = 0
+
+    def _vector(self, text):
+        seed = int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "little")
+        vector = np.random.default_rng(seed).normal(size=self.dimensions)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts):
+        self.requests += 1
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+class FakeLLM:
+    """Chat model stand-in that answers every prompt through a reply function."""
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.calls = []
+
+    def invoke(self, messages, **kwargs):
+        self.calls.append(messages)
+        return SimpleNamespace(content=self.reply(messages))
+
+    def batch(self, inputs, return_exceptions=False, **kwargs):
+        return [self.invoke(messages, **kwargs) for messages in inputs]
+
+    def stream(self, messages, **kwargs):
+        reply = self.invoke(messages, **kwargs).content
+        for i in range(0, len(reply), 5):
+            yield SimpleNamespace(content=reply[i:i + 5])
+
+
+def make_documents():
+    return [
+        LangchainDocument(
+            page_content=f"digital health strategy governance section {i}",
+            metadata={"doc_id": f"doc{i}", "source": f"file{i % 2}.pdf", "page": i % 3}
+        )
+        for i in range(6)
+    ]
+
+
+@pytest.fixture
+def documents():
+    return make_documents()
+
+
+@pytest.fixture
+def vector_store(tmp_path):
+    return VectorStore(
+        embeddings=FakeEmbeddings(),
+        persist_directory=str(tmp_path / "chroma"),
+        embedding_cache=EmbeddingCache(str(tmp_path / "embeddings.sqlite"))
+    )
+
+
+@pytest.fixture
+def retriever(tmp_path, vector_store):
+    return AdvancedRetriever(vector_store, index_dir=str(tmp_path / "bm25_index"))
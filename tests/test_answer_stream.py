@@ -0,0 +1,51 @@
+"""Picking the answer section out of a streamed reply."""
+
+from langchain_core.caches import InMemoryCache
+from langchain_core.globals import set_llm_cache
+
+from rag.prompting import AnswerGenerator, AnswerStreamParser
+
+from conftest import FakeLLM, make_documents
+
+
+def stream(pieces):
+    parser = AnswerStreamParser()
+    shown = "".join(parser.feed(piece) for piece in pieces)
+    return shown + parser.finish()
+
+
+def test_answer_stops_at_the_first_section():
+    reply = "Answer: The strategy covers governance.\nCitations: file0.pdf\nConfidence: high"
+    # Split at every position, including through the markers themselves
+    for size in (1, 3, 7, len(reply)):
+        pieces = [reply[i:i + size] for i in range(0, len(reply), size)]
+        assert stream(pieces) == "The strategy covers governance."
+
+
+def test_confidence_before_citations_also_ends_the_answer():
+    assert stream(["Answer: Yes.", "\nConfidence: low", "\nCitations: none"]) == "Yes."
+
+
+def test_reply_without_marker_is_all_answer():
+    assert stream(["  The plan", " runs to 2030."]) == "The plan runs to 2030."
+
+
+def test_text_after_the_sections_is_not_shown():
+    parser = AnswerStreamParser()
+    shown = parser.feed("Answer: Short.\nCitations: a.pdf\n")
+    assert shown == "Short."
+    assert parser.feed("More text") == ""
+    assert parser.finish() == ""
+
+
+def test_streamed_replies_are_served_from_the_llm_cache():
+    llm = FakeLLM(lambda messages: "Answer: The plan runs to 2030.\nConfidence: high")
+    generator = AnswerGenerator(llm=llm)
+    set_llm_cache(InMemoryCache())
+    try:
+        replies = ["".join(generator.stream_answer("When does the plan end?", make_documents())) for _ in range(2)]
+    finally:
+        set_llm_cache(None)
+
+    assert replies == ["The plan runs to 2030.", "The plan runs to 2030."]
+    assert len(llm.calls) == 1
@@ -0,0 +1,34 @@
+"""Follow-up question generation on the synchronous path the app uses."""
+
+from rag.prompting import AnswerGenerator
+
+from conftest import FakeLLM, make_documents
+
+
+SUGGESTIONS = [
+    "What governance frameworks does the strategy recommend?",
+    "How many moons does Jupiter have in total?",
+    "Which interoperability standards are mentioned?"
+]
+
+
+def reply(messages):
+    """Suggest SUGGESTIONS, then answer YES to the answerability check except for the Jupiter one."""
+    prompt = messages[-1].content
+    if "Question:" in prompt and "Jupiter" not in prompt and "Original Question" not in prompt:
+        return "YES"
+    if "Original Question" in prompt:
+        return "\n".join(f"{i}. {question}" for i, question in enumerate(SUGGESTIONS, 1))
+    return "NO"
+
+
+def test_sync_followups_drop_unanswerable_questions():
+    llm = FakeLLM(reply)
+
+    questions = AnswerGenerator(llm=llm).generate_followup_questions(
+        "What is the digital health strategy?", "The strategy covers governance.", make_documents()
+    )
+
+    assert questions == [SUGGESTIONS[0], SUGGESTIONS[2]]
+    # One generation call plus one answerability check per suggestion
+    assert len(llm.calls) == 4
@@ -0,0 +1,54 @@
+"""Query embedding batching and caching."""
+
+import asyncio
+import time
+
+from rag import indexing
+from rag.indexing import EmbeddingCache, QueryEmbeddingBatcher, VectorStore
+
+from conftest import FakeEmbeddings, make_documents
+
+
+def test_query_embeddings_are_cached_per_dimension():
+    embeddings = FakeEmbeddings(dimensions=4)
+    batcher = QueryEmbeddingBatcher(embeddings, window=0)
+
+    assert len(batcher.embed_query("digital health")) == 4
+    assert len(batcher.embed_query("digital health")) == 4
+    assert embeddings.requests == 1
+
+    # A reset store re-embeds at a new size, so cached vectors must not be reused
+    embeddings.dimensions = 8
+    assert len(batcher.embed_query("digital health")) == 8
+    assert embeddings.requests == 2
+
+
+def test_failed_embed_stops_ingest_and_leaves_no_tasks(tmp_path, monkeypatch):
+    monkeypatch.setattr(indexing, "INGESTION_BATCH_SIZE", 1)
+
+    class FailingEmbeddings(FakeEmbeddings):
+        def embed_documents(self, texts):
+            if any("boom" in text for text in texts):
+                raise RuntimeError("embedding failed")
+            time.sleep(0.05)
+            return super().embed_documents(texts)
+
+    store = VectorStore(
+        embeddings=FailingEmbeddings(),
+        persist_directory=str(tmp_path / "chroma"),
+        embedding_cache=EmbeddingCache(str(tmp_path / "embeddings.sqlite"))
+    )
+    documents = make_documents()
+    documents[1].page_content = "boom"
+
+    assert store.add_documents(documents) is False
+
+    # Nothing is left running on the shared ingest loop, so the count stays put
+    async def running_tasks():
+        return len(asyncio.all_tasks()) - 1
+
+    loop = indexing._get_ingest_loop()
+    assert asyncio.run_coroutine_threadsafe(running_tasks(), loop).result() == 0
+    count = store.vector_store._collection.count()
+    time.sleep(0.2)
+    assert store.vector_store._collection.count() == count
@@ -0,0 +1,62 @@
+"""Loading files and skipping the ones unchanged since the last ingest."""
+
+import os
+
+from rag.ingestion import DocumentProcessor, IngestManifest
+from rag.prompting import AnswerGenerator, RAGSystem
+
+from conftest import FakeLLM
+
+
+def test_changed_files_tracks_content_not_timestamps(tmp_path):
+    manifest = IngestManifest(str(tmp_path / "manifest.sqlite"))
+    first, second = tmp_path / "a.txt", tmp_path / "b.txt"
+    first.write_text("first version")
+    second.write_text("unchanged")
+
+    assert manifest.changed_files([first, second]) == [first, second]
+    manifest.record([first, second])
+    assert manifest.changed_files([first, second]) == []
+
+    # Touching a file without changing it is not a change
+    stat = second.stat()
+    os.utime(second, (stat.st_atime, stat.st_mtime + 10))
+    first.write_text("second version")
+    assert manifest.changed_files([first, second]) == [first]
+
+    manifest.clear()
+    assert manifest.changed_files([first, second]) == [first, second]
+
+
+def test_same_named_files_in_different_folders_stay_distinct(tmp_path):
+    (tmp_path / "2023").mkdir()
+    (tmp_path / "2024").mkdir()
+    (tmp_path / "2023" / "report.txt").write_text("old budget figures")
+    (tmp_path / "2024" / "report.txt").write_text("new budget figures")
+    processor = DocumentProcessor()
+
+    documents = processor.load_documents(str(tmp_path))
+
+    assert [doc.metadata["source"] for doc in documents] == ["2023/report.txt", "2024/report.txt"]
+    assert len({doc.metadata["doc_id"] for doc in documents}) == 2
+
+
+def test_editing_one_of_two_same_named_files_keeps_the_other(tmp_path, retriever):
+    root = tmp_path / "uploads"
+    (root / "2023").mkdir(parents=True)
+    (root / "2024").mkdir()
+    (root / "2023" / "report.txt").write_text("old budget figures")
+    (root / "2024" / "report.txt").write_text("new budget figures")
+    system = RAGSystem(
+        vector_store=retriever.vector_store,
+        retriever=retriever,
+        generator=AnswerGenerator(llm=FakeLLM(lambda messages: "")),
+        ingest_manifest=IngestManifest(str(tmp_path / "manifest.sqlite"))
+    )
+    assert system.ingest_documents(str(root))["success"]
+
+    (root / "2024" / "report.txt").write_text("revised budget figures")
+    assert system.ingest_documents(str(root))["success"]
+
+    stored = retriever.vector_store.get_documents_by_source(["2023/report.txt", "2024/report.txt"])
+    assert sorted(doc.page_content for doc in stored) == ["old budget figures", "revised budget figures"]
@@ -0,0 +1,99 @@
+"""BM25 scoring, rank fusion and MMR selection."""
+
+import math
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document as LangchainDocument
+
+from rag.retrieval import BM25_EPSILON, BM25_B, BM25_K1, RRF_K, SparseBM25
+
+
+CORPUS = [
+    "digital health strategy governance".split(),
+    "health data interoperability standards health".split(),
+    "governance of health records".split(),
+    "health workforce training".split(),
+    "telemedicine pilot in rural clinics".split()
+]
+
+
+def okapi_scores(corpus, query_tokens):
+    """BM25Okapi written out term by term, including its epsilon floor for negative idf."""
+    avgdl = sum(map(len, corpus)) / len(corpus)
+    vocab = {token for doc in corpus for token in doc}
+    idf = {}
+    for token in vocab:
+        doc_freq = sum(token in doc for doc in corpus)
+        idf[token] = math.log(len(corpus) - doc_freq + 0.5) - math.log(doc_freq + 0.5)
+    floor = BM25_EPSILON * sum(idf.values()) / len(idf)
+    idf = {token: floor if value < 0 else value for token, value in idf.items()}
+
+    scores = []
+    for doc in corpus:
+        score = 0.0
+        for token in query_tokens:
+            freq = doc.count(token)
+            score += idf.get(token, 0.0) * freq * (BM25_K1 + 1) / (
+                freq + BM25_K1 * (1 - BM25_B + BM25_B * len(doc) / avgdl)
+            )
+        scores.append(score)
+    return np.array(scores)
+
+
+QUERIES = [
+    ["health"],  # In 4 of 5 documents, so its idf is floored
+    ["governance", "health"],
+    ["health", "health", "standards"],
+    ["unknown"],
+    []
+]
+
+
+@pytest.mark.parametrize("query_tokens", QUERIES)
+def test_sparse_bm25_matches_okapi(query_tokens):
+    index = SparseBM25(CORPUS)
+    np.testing.assert_allclose(index.get_scores(query_tokens), okapi_scores(CORPUS, query_tokens))
+
+
+def test_sparse_bm25_batch_matches_single_queries():
+    index = SparseBM25(CORPUS)
+    batch = index.get_batch_scores(QUERIES)
+    for row, query_tokens in zip(batch, QUERIES):
+        np.testing.assert_allclose(row, okapi_scores(CORPUS, query_tokens))
+
+
+def doc(doc_id):
+    return LangchainDocument(page_content=doc_id, metadata={"doc_id": doc_id})
+
+
+def test_rrf_weights_each_ranking(retriever):
+    semantic = [doc("a"), doc("b"), doc("c")]
+    bm25 = [(doc("c"), 9.0), (doc("d"), 5.0), (doc("a"), 1.0)]
+
+    fused = retriever._combine_search_results(semantic, bm25, semantic_weight=0.7)
+
+    expected = {
+        "a": 0.7 / (RRF_K + 1) + 0.3 / (RRF_K + 3),
+        "b": 0.7 / (RRF_K + 2),
+        "c": 0.7 / (RRF_K + 3) + 0.3 / (RRF_K + 1),
+        "d": 0.3 / (RRF_K + 2)
+    }
+    assert [d.metadata["doc_id"] for d in fused] == sorted(expected, key=expected.get, reverse=True)
+    # Scores never enter the fusion, only ranks, and k keeps the best
+    assert len(retriever._combine_search_results(semantic, bm25, semantic_weight=0.7, k=2)) == 2
+
+
+def test_mmr_skips_near_duplicates(retriever, monkeypatch):
+    candidates = [doc("a"), doc("a-copy"), doc("b"), doc("c")]
+    embeddings = np.array([[0.95, 0.31], [0.95, 0.31], [0.95, -0.31], [0.0, 1.0]])
+    monkeypatch.setattr(
+        retriever.vector_store, "similarity_search_with_embeddings",
+        lambda query, k: (candidates, embeddings, np.array([1.0, 0.0]))
+    )
+
+    diverse = retriever.get_diverse_results("query", k=2, lambda_mult=0.5)
+    relevant = retriever.get_diverse_results("query", k=2, lambda_mult=1.0)
+
+    assert [d.metadata["doc_id"] for d in diverse] == ["a", "b"]
+    assert [d.metadata["doc_id"] for d in relevant] == ["a", "a-copy"]
@@ -0,0 +1,69 @@
+"""Metadata-filtered retrieval against a Chroma collection built through the ingest path."""
+
+from rag.retrieval import AdvancedRetriever
+
+
+def test_two_key_filter_applies_to_both_hybrid_branches(retriever, documents):
+    assert retriever.vector_store.add_documents(documents)
+    retriever.build_bm25_index(documents)
+    metadata_filter = {"source": "file0.pdf", "page": 1}
+
+    semantic_docs = retriever.vector_store.similarity_search("governance", k=6, filter_metadata=metadata_filter)
+    bm25_docs = [doc for doc, _ in retriever.bm25_search("governance section", k=6, metadata_filter=metadata_filter)]
+    hybrid_docs = retriever.retrieve_with_metadata_filter("governance", metadata_filter, k=6, use_hybrid=True)
+
+    # Only doc4 is on page 1 of file0.pdf
+    assert [doc.metadata["doc_id"] for doc in semantic_docs] == ["doc4"]
+    assert [doc.metadata["doc_id"] for doc in hybrid_docs] == ["doc4"]
+    assert all(doc.metadata["doc_id"] == "doc4" for doc in bm25_docs)
+
+
+def test_two_key_filter_with_embeddings(vector_store, documents):
+    assert vector_store.add_documents(documents)
+
+    docs, embeddings, _ = vector_store.similarity_search_with_embeddings(
+        "governance", k=6, filter_metadata={"source": "file1.pdf", "page": 2}
+    )
+
+    # doc5 is the only chunk on page 2 of file1.pdf
+    assert [doc.metadata["doc_id"] for doc in docs] == ["doc5"]
+    assert embeddings.shape == (1, 16)
+
+
+def test_sources_summary_follows_corpus_changes(retriever, documents):
+    retriever.build_bm25_index(documents[:2])
+    assert [source["chunks"] for source in retriever.get_sources_summary()] == [1, 1]
+
+    # Another session ingests through the same shared retriever
+    retriever.build_bm25_index(documents)
+    assert {source["name"]: source["chunks"] for source in retriever.get_sources_summary()} == {
+        "file0.pdf": 3, "file1.pdf": 3
+    }
+
+
+def test_bm25_index_reloads_without_pickle(tmp_path, retriever, documents):
+    assert retriever.vector_store.add_documents(documents)
+    retriever.build_bm25_index(documents)
+    saved = sorted(path.suffix for path in (tmp_path / "bm25_index").iterdir())
+    assert saved == [".json", ".npz"]
+
+    # A restarted app restores the index for the chunks Chroma already holds
+    restored = AdvancedRetriever(retriever.vector_store, index_dir=str(tmp_path / "bm25_index"))
+    assert restored.corpus_fingerprint == retriever.corpus_fingerprint
+    assert [
+        (doc.metadata["doc_id"], round(score, 6)) for doc, score in restored.bm25_search("governance section 3", k=3)
+    ] == [
+        (doc.metadata["doc_id"], round(score, 6)) for doc, score in retriever.bm25_search("governance section 3", k=3)
+    ]
+
+
+def test_stale_bm25_index_is_not_reused(tmp_path, retriever, documents):
+    retriever.build_bm25_index(documents[:3])
+    stale = retriever.corpus_fingerprint
+
+    # The store now holds a different corpus, so the old files must not be loaded
+    assert retriever.vector_store.add_documents(documents)
+    restored = AdvancedRetriever(retriever.vector_store, index_dir=str(tmp_path / "bm25_index"))
+    assert restored.corpus_fingerprint != stale
+    assert len(restored.documents_corpus) == len(documents)
+    assert not list((tmp_path / "bm25_index").glob(f"{stale}.*"))